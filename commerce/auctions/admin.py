@@ -1,9 +1,181 @@
+from datetime import datetime, timedelta
+
+from django import forms
 from django.contrib import admin
-from .models import User, Auction, Bid, Comment, Category, Watchlist, Listing
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Max, Min, QuerySet
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import User, Auction, Bid, Comment, Category, Watchlist
 
 # Register your models here.
 
 
+# A filtered list is counted up to this many rows; past it, the admin
+# shows this many and pages no further.
+COUNT_LIMIT = 10000
+
+
+def estimated_count(model):
+    """
+    Returns roughly how many rows model's table has, without counting
+    them. Ids are never reused and bids and comments are rarely deleted,
+    so on SQLite the largest id is a close estimate.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        else:
+            cursor.execute(f"SELECT MAX({connection.ops.quote_name(model._meta.pk.column)}) FROM {table}")
+        row = cursor.fetchone()
+    return max(row[0] or 0, 0) if row else 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Estimates the size of an unfiltered list and counts at most
+    COUNT_LIMIT rows of a filtered one, so that a changelist of a huge
+    table does not start with a COUNT(*) over all of it.
+    """
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            return estimated_count(self.object_list.model)
+        return self.object_list[:COUNT_LIMIT].count()
+
+
+def _next_period(start, kind):
+    if kind == "year":
+        return start.replace(year=start.year + 1)
+    if kind == "month":
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start + timedelta(days=1)
+
+
+class PeriodQuerySet(QuerySet):
+    """
+    Answers the date hierarchy's question, in which years, months or days
+    the list has rows, with one indexed range query per candidate period,
+    instead of truncating and de-duplicating the date of every row.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        # The date hierarchy asks for the first and last date together,
+        # but SQLite only reads MIN() or MAX() off an index when it is
+        # the only aggregate of its query.
+        if args or len(kwargs) < 2 or not all(isinstance(value, (Min, Max)) for value in kwargs.values()):
+            return super().aggregate(*args, **kwargs)
+        return {name: super(PeriodQuerySet, self).aggregate(value=value)["value"]
+                for name, value in kwargs.items()}
+
+    def datetimes(self, field_name, kind, order="ASC", tzinfo=None):
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds["first"] is None:
+            return []
+        first = timezone.localtime(bounds["first"]).replace(tzinfo=None)
+        last = timezone.localtime(bounds["last"]).replace(tzinfo=None)
+        start = datetime(first.year, 1 if kind == "year" else first.month, first.day if kind == "day" else 1)
+        found = []
+        while start <= last:
+            end = _next_period(start, kind)
+            period = {
+                f"{field_name}__gte": timezone.make_aware(start),
+                f"{field_name}__lt": timezone.make_aware(end),
+            }
+            if self.filter(**period).exists():
+                found.append(period[f"{field_name}__gte"])
+            start = end
+        return found if order == "ASC" else found[::-1]
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """
+    Filters on a foreign key with the admin's search-as-you-type box,
+    instead of a list of every related object. Subclasses set field_name.
+    """
+
+    template = "admin/auctions/autocomplete_filter.html"
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        field = model._meta.get_field(self.field_name)
+        self.title = field.verbose_name
+        self.parameter_name = f"{self.field_name}__id__exact"
+        super().__init__(request, params, model, model_admin)
+        remote = field.remote_field.model
+        choice = forms.ModelChoiceField(
+            queryset=remote._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site),
+            required=False,
+        )
+        self.form = type("AutocompleteFilterForm", (forms.Form,), {self.parameter_name: choice})(
+            {self.parameter_name: self.value()}
+        )
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            return queryset.filter(**{self.parameter_name: self.value()})
+        except (ValueError, ValidationError) as e:
+            raise IncorrectLookupParameters(e)
+
+    @property
+    def field(self):
+        return self.form[self.parameter_name]
+
+
+class AuctionFilter(AutocompleteFilter):
+    field_name = "auction"
+
+
+class UserFilter(AutocompleteFilter):
+    field_name = "user"
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    A changelist that costs the same however large its table grows: the
+    rows' auction and user come with the page, the filters search rather
+    than list every auction and user, and rows are estimated rather than
+    counted. Its model needs an index on timestamp for the date hierarchy.
+    """
+
+    list_select_related = ("auction", "user")
+    list_filter = (AuctionFilter, UserFilter)
+    autocomplete_fields = ("auction", "user")
+    date_hierarchy = "timestamp"
+    # Served by the timestamp indexes whether or not the list is filtered
+    # by date or auction, unlike the default "-pk".
+    ordering = ("-timestamp",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        autocomplete = AutocompleteSelect(self.opts.get_field("auction"), self.admin_site)
+        return super().media + autocomplete.media + forms.Media(
+            js=["admin/js/jquery.init.js", "auctions/admin_filters.js"],
+        )
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return PeriodQuerySet(model=queryset.model, query=queryset.query, using=queryset.db)
+
+
 class UserAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff',)
     search_fields = ('username', 'email')
@@ -16,17 +188,15 @@ class AuctionAdmin(admin.ModelAdmin):
     readonly_fields = ('start_time', 'end_time')
 admin.site.register(Auction, AuctionAdmin)
 
-class BidAdmin(admin.ModelAdmin):
+class BidAdmin(LargeTableAdmin):
     list_display = ('auction', 'user', 'amount', 'timestamp')
     search_fields = ('auction__title', 'user__username')
-    list_filter = ('auction', 'user')
     readonly_fields = ('timestamp',)
 admin.site.register(Bid, BidAdmin)
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('auction', 'user', 'content', 'timestamp')
     search_fields = ('auction__title', 'user__username', 'content')
-    list_filter = ('auction', 'user')
     readonly_fields = ('timestamp',)
 admin.site.register(Comment, CommentAdmin)
 
@@ -40,9 +210,3 @@ class WatchlistAdmin(admin.ModelAdmin):
     list_display = ('user', 'auction',)
     search_fields = ('user__username', 'auction__title')
 admin.site.register(Watchlist, WatchlistAdmin)
-
-class ListingAdmin(admin.ModelAdmin):
-    list_display = ('auction', 'category')
-    search_fields = ('auction__title', 'category__name')
-    list_filter = ('category',)
-admin.site.register(Listing, ListingAdmin)
\ No newline at end of file
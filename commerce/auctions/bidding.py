@@ -0,0 +1,228 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import catalog
+from .listings import invalidate_listings, record_price
+from .models import Auction, Bid, BidSummary
+from .pubsub import publish_bid, publish_closed
+
+
+class BidRejected(ValueError):
+    """
+    Raised when a bid is not accepted. Subclasses ValueError, which is
+    what Bid.save() has always raised for a bid that is too low.
+    """
+
+
+def accept_bid(bid):
+    """
+    Records a new bid and raises its auction's price in one transaction.
+
+    The bid row is inserted and then the auction is updated with a
+    single conditional UPDATE that only matches an open, unexpired
+    auction, not owned by the bidder, whose price is below the bid. The
+    same UPDATE bumps the auction's bid count and points it at its new
+    highest bid.
+    Two concurrent bids can therefore never both win and a lower bid can
+    never overwrite a higher one. The bidder's BidSummary row is then
+    brought up to date, and the previous leader's marked outbid. An
+    accepted bid costs one INSERT and three UPDATEs (a second INSERT on
+    a user's first bid on an auction) and no reads.
+
+    The amount is first checked against Bid.amount's own limits, so that
+    no amount the column cannot hold (NaN, infinities, too many digits
+    or decimal places) is ever written to it or to the auction's price.
+    """
+    try:
+        bid.amount = Bid._meta.get_field("amount").clean(bid.amount, bid)
+    except ValidationError:
+        raise BidRejected("Please enter a valid bid amount.")
+    try:
+        with transaction.atomic():
+            Bid.objects.bulk_create([bid])
+            updated = (Auction.objects
+                .filter(pk=bid.auction_id, is_active=True,
+                        current_price__lt=bid.amount, starting_price__lt=bid.amount)
+                .filter(~Q(owner_id=bid.user_id))
+                .filter(Q(end_time__isnull=True) | Q(end_time__gt=timezone.now()))
+                .update(current_price=bid.amount, bid_count=F("bid_count") + 1, highest_bid=bid.pk))
+            if not updated:
+                raise BidRejected(_rejection_reason(bid))
+            _record_summary(bid)
+            transaction.on_commit(lambda: _bid_accepted(bid))
+    except BidRejected:
+        bid.pk = None
+        bid._state.adding = True
+        raise
+
+    if Bid.auction.is_cached(bid):
+        auction = bid.auction
+        auction.current_price = bid.amount
+        auction.highest_bid = bid
+        if "bid_count" in auction.__dict__:
+            auction.bid_count += 1
+    return bid
+
+
+def place_bid(auction, user, amount):
+    """
+    Places a bid of amount by user on auction (an Auction or its id) and
+    returns the new Bid. Raises BidRejected if the bid is not accepted.
+    """
+    if isinstance(auction, Auction):
+        return accept_bid(Bid(auction=auction, user=user, amount=amount))
+    return accept_bid(Bid(auction_id=auction, user=user, amount=amount))
+
+
+def close_auctions(auctions):
+    """
+    Closes every open auction in the auctions queryset and makes the
+    author of each one's highest bid its winner, in one UPDATE, then
+    announces the closures to anyone watching them live. Returns
+    the number of auctions closed; auctions closed concurrently by
+    someone else are not counted, so each is closed exactly once.
+    """
+    rows = list(auctions.filter(is_active=True).values_list("pk", "category_id"))
+    ids = [pk for pk, _ in rows]
+    if not ids:
+        return 0
+    winner = Bid.objects.filter(pk=OuterRef("highest_bid_id")).values("user_id")
+    closed = (Auction.objects.filter(pk__in=ids, is_active=True)
+        .update(is_active=False, winner_id=Subquery(winner)))
+    if closed:
+        invalidate_listings()
+        if closed == len(ids):
+            catalog.adjust([category_id for _, category_id in rows], -1)
+        else:
+            # Some were closed concurrently, and which is unknown.
+            catalog.invalidate()
+        transaction.on_commit(lambda: publish_closed(ids))
+    return closed
+
+
+def close_auction(auction):
+    """
+    Closes an open auction and picks its winner. Returns False if it was
+    already closed.
+    """
+    closed = close_auctions(Auction.objects.filter(pk=auction.pk))
+    auction.refresh_from_db(fields=["is_active", "winner"])
+    return bool(closed)
+
+
+def rebuild_bid_stats(auctions=None):
+    """
+    Recomputes bid_count and highest_bid from the Bid table, for example
+    after bids were deleted by hand. Returns the number of auctions.
+    """
+    if auctions is None:
+        auctions = Auction.objects.all()
+    bids = Bid.objects.filter(auction=OuterRef("pk"))
+    return auctions.update(
+        bid_count=Coalesce(Subquery(
+            bids.order_by().values("auction").annotate(n=Count("pk")).values("n")
+        ), 0),
+        highest_bid=Subquery(bids.order_by("-amount", "-pk").values("pk")[:1]),
+    )
+
+
+def rebuild_bid_summaries(auctions=None):
+    """
+    Recomputes the BidSummary rows of auctions from the Bid table, for
+    example after bids were imported or deleted by hand. Run it after
+    rebuild_bid_stats(), which picks the highest bids that lead. Returns
+    the number of rows written.
+    """
+    summaries = BidSummary.objects.all()
+    bids = Bid.objects.all()
+    if auctions is not None:
+        summaries = summaries.filter(auction__in=auctions)
+        bids = bids.filter(auction__in=auctions)
+    summaries.delete()
+    rows = (bids.values("auction", "user")
+        .annotate(amount=Max("amount"), n=Count("pk"), last=Max("timestamp"),
+                  leader=F("auction__highest_bid__user"))
+        .order_by())
+    written = 0
+    batch = []
+    for row in rows.iterator(chunk_size=2000):
+        batch.append(BidSummary(
+            user_id=row["user"], auction_id=row["auction"], amount=row["amount"], bid_count=row["n"],
+            last_bid_at=row["last"], is_leading=row["leader"] == row["user"],
+        ))
+        if len(batch) == 2000:
+            written += len(BidSummary.objects.bulk_create(batch))
+            batch = []
+    written += len(BidSummary.objects.bulk_create(batch))
+    return written
+
+
+def _record_summary(bid):
+    # The auction UPDATE that accepted bid holds the auction's row until
+    # the transaction ends, so bids on one auction get here one at a
+    # time and the UPDATE-then-INSERT cannot race. An accepted bid is
+    # always its author's highest on the auction.
+    (BidSummary.objects.filter(auction_id=bid.auction_id, is_leading=True)
+        .exclude(user_id=bid.user_id).update(is_leading=False))
+    updated = (BidSummary.objects.filter(user_id=bid.user_id, auction_id=bid.auction_id)
+        .update(amount=bid.amount, bid_count=F("bid_count") + 1, last_bid_at=bid.timestamp, is_leading=True))
+    if not updated:
+        BidSummary.objects.create(
+            user_id=bid.user_id, auction_id=bid.auction_id, amount=bid.amount,
+            bid_count=1, last_bid_at=bid.timestamp, is_leading=True,
+        )
+
+
+def user_bids(user):
+    """
+    Returns user's BidSummary rows with their auctions, most recently bid
+    on first, read from one index whatever the number of bids.
+    """
+    return (BidSummary.objects.filter(user_id=user.id)
+        .select_related("auction")
+        .only("amount", "bid_count", "last_bid_at", "is_leading",
+              "auction__id", "auction__title", "auction__current_price", "auction__starting_price",
+              "auction__is_active", "auction__end_time")
+        .order_by("-last_bid_at", "-id"))
+
+
+def bid_totals(user):
+    """
+    Sums up user's BidSummary rows: on how many open auctions they lead
+    or were outbid, how many closed ones they won or lost, and what the
+    leading and winning bids add up to. Reads one row per auction the
+    user bid on, not their bids.
+    """
+    leading = Q(is_leading=True, auction__is_active=True)
+    won = Q(is_leading=True, auction__is_active=False)
+    return BidSummary.objects.filter(user_id=user.id).aggregate(
+        leading=Count("id", filter=leading),
+        outbid=Count("id", filter=Q(is_leading=False, auction__is_active=True)),
+        won=Count("id", filter=won),
+        lost=Count("id", filter=Q(is_leading=False, auction__is_active=False)),
+        committed=Coalesce(Sum("amount", filter=leading), Decimal("0.00")),
+        spent=Coalesce(Sum("amount", filter=won), Decimal("0.00")),
+    )
+
+
+def _bid_accepted(bid):
+    record_price(bid.auction_id, bid.amount)
+    publish_bid(bid)
+
+
+def _rejection_reason(bid):
+    # Only rejected bids pay for this read, to explain why.
+    auction = (Auction.objects.filter(pk=bid.auction_id)
+        .values("is_active", "owner_id", "end_time").first())
+    if auction is None:
+        return "This auction does not exist."
+    if not auction["is_active"] or (auction["end_time"] and auction["end_time"] <= timezone.now()):
+        return "This auction is no longer active."
+    if auction["owner_id"] == bid.user_id:
+        return "You cannot bid on your own auction."
+    return "Bid amount must be greater than the current price."
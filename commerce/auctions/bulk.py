@@ -0,0 +1,269 @@
+"""
+Streaming import and export of auctions, bids and comments as JSONL or
+CSV, used by the import_auctions and export_auctions commands.
+
+Rows refer to users by username and to categories by name; bids and
+comments refer to auctions by id, which exports keep. Rows are read and
+written one at a time and inserted in bulk_create batches, and foreign
+keys are resolved per batch, so memory does not grow with the file.
+"""
+
+import csv
+import json
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import reset_queries
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from django.utils.dateparse import parse_datetime
+
+from . import catalog
+from .bidding import rebuild_bid_stats, rebuild_bid_summaries
+from .listings import invalidate_listings
+from .models import Auction, Bid, Category, Comment, User
+from .search import index_auctions
+
+
+FIELDS = {
+    "auctions": [
+        "id", "title", "description", "owner", "category", "starting_price", "current_price",
+        "is_active", "start_time", "end_time", "winner", "image",
+    ],
+    "bids": ["id", "auction", "user", "amount", "timestamp"],
+    "comments": ["id", "auction", "user", "content", "timestamp"],
+}
+
+BATCH_SIZE = 2000
+
+
+def read_rows(f, fmt):
+    """
+    Yields the rows of a JSONL or CSV file as dicts, one at a time.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(f)
+        return
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def write_rows(f, fmt, fields, rows):
+    if fmt == "csv":
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+        return
+    for row in rows:
+        f.write(json.dumps(row, default=str))
+        f.write("\n")
+
+
+def export_rows(kind):
+    """
+    Yields every row of kind ("auctions", "bids" or "comments") in id
+    order, streamed from one query.
+    """
+    if kind == "auctions":
+        rows = Auction.objects.values(
+            "id", "title", "description", "starting_price", "current_price", "is_active",
+            "start_time", "end_time", "image",
+            owner_name=F("owner__username"), category_name=F("category__name"),
+            winner_name=F("winner__username"),
+        )
+        renames = {"owner_name": "owner", "category_name": "category", "winner_name": "winner"}
+    else:
+        model = Bid if kind == "bids" else Comment
+        value = "amount" if kind == "bids" else "content"
+        rows = model.objects.values("id", value, "timestamp", auction_ref=F("auction_id"),
+                                    user_name=F("user__username"))
+        renames = {"auction_ref": "auction", "user_name": "user"}
+    for row in rows.order_by("id").iterator(chunk_size=BATCH_SIZE):
+        for old, new in renames.items():
+            row[new] = row.pop(old)
+        for name, value in row.items():
+            if value is None:
+                row[name] = ""
+            elif hasattr(value, "isoformat"):
+                row[name] = value.isoformat()
+            elif isinstance(value, Decimal):
+                row[name] = str(value)
+        yield row
+
+
+def _bulk_create(model, objects, field):
+    # bulk_create applies auto_now_add, which would replace the imported
+    # creation times with the time of the import, so they are written
+    # back afterwards. Objects without one keep the time of the import.
+    imported = [(obj, getattr(obj, field)) for obj in objects if getattr(obj, field) is not None]
+    model.objects.bulk_create(objects)
+    for obj, value in imported:
+        setattr(obj, field, value)
+    model.objects.bulk_update([obj for obj, _ in imported], [field])
+
+
+class NameMap:
+    """
+    Maps names to primary keys, looking up and creating the unknown
+    names of a batch in two queries.
+    """
+
+    def __init__(self, model, field, defaults=None):
+        self.model = model
+        self.field = field
+        self.defaults = defaults or {}
+        self.ids = {}
+
+    def resolve(self, names):
+        missing = {name for name in names if name and name not in self.ids}
+        if not missing:
+            return
+        self.ids.update(self.model.objects.filter(**{f"{self.field}__in": missing})
+                        .values_list(self.field, "id"))
+        missing -= self.ids.keys()
+        if missing:
+            self.model.objects.bulk_create(
+                [self.model(**{self.field: name}, **self.defaults) for name in missing],
+                ignore_conflicts=True,
+            )
+            self.ids.update(self.model.objects.filter(**{f"{self.field}__in": missing})
+                            .values_list(self.field, "id"))
+
+    def get(self, name):
+        return self.ids.get(name) if name else None
+
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+            # With DEBUG on, every INSERT would stay in connection.queries.
+            reset_queries()
+    if batch:
+        yield batch
+
+
+def _decimal(value):
+    return Decimal(value) if value not in (None, "") else None
+
+
+def _datetime(value):
+    return parse_datetime(value) if value else None
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ("", "0", "false", "no")
+
+
+def _id(value):
+    return int(value) if value not in (None, "") else None
+
+
+def import_auctions(rows, batch_size=BATCH_SIZE):
+    """
+    Creates auctions from rows and returns how many. Like CreateAuction,
+    an auction without a current_price starts at its starting_price.
+    Users and categories named by the rows are created if missing.
+    """
+    users = NameMap(User, "username", {"password": make_password(None)})
+    categories = NameMap(Category, "name")
+    imported = 0
+    for batch in _batches(rows, batch_size):
+        users.resolve([row.get("owner") for row in batch] + [row.get("winner") for row in batch])
+        categories.resolve([row.get("category") for row in batch])
+        auctions = []
+        for row in batch:
+            starting_price = _decimal(row["starting_price"])
+            auction = Auction(
+                id=_id(row.get("id")),
+                title=row["title"],
+                description=row.get("description", ""),
+                owner_id=users.get(row["owner"]),
+                category_id=categories.get(row.get("category")),
+                starting_price=starting_price,
+                current_price=_decimal(row.get("current_price")) or starting_price,
+                is_active=_boolean(row.get("is_active", True)),
+                end_time=_datetime(row.get("end_time")),
+                winner_id=users.get(row.get("winner")),
+                image=row.get("image") or None,
+                start_time=_datetime(row.get("start_time")),
+            )
+            auctions.append(auction)
+        _bulk_create(Auction, auctions, "start_time")
+        # bulk_create sends no post_save, which keeps search and
+        # the catalog's counts in sync.
+        index_auctions(auctions)
+        catalog.adjust([a.category_id for a in auctions if a.is_active], +1)
+        imported += len(auctions)
+    invalidate_listings()
+    return imported
+
+
+def _import_children(model, rows, batch_size, build):
+    # Returns (imported, skipped, ids of the auctions that got rows).
+    users = NameMap(User, "username", {"password": make_password(None)})
+    imported = skipped = 0
+    touched = set()
+    for batch in _batches(rows, batch_size):
+        users.resolve([row.get("user") for row in batch])
+        auction_ids = set(Auction.objects.filter(id__in={_id(row["auction"]) for row in batch})
+                          .values_list("id", flat=True))
+        objects = []
+        for row in batch:
+            auction_id = _id(row["auction"])
+            if auction_id not in auction_ids:
+                skipped += 1
+                continue
+            obj = build(row, auction_id, users.get(row["user"]))
+            obj.timestamp = _datetime(row.get("timestamp"))
+            objects.append(obj)
+        _bulk_create(model, objects, "timestamp")
+        imported += len(objects)
+        touched.update(obj.auction_id for obj in objects)
+    return imported, skipped, touched
+
+
+def _refresh_prices(auction_ids):
+    # Imported bids bypass the bid engine, so recompute what it keeps up
+    # to date: bid_count, highest_bid, the bidders' summaries, and a
+    # current_price no lower than the highest bid.
+    auctions = Auction.objects.filter(id__in=auction_ids)
+    rebuild_bid_stats(auctions)
+    top = Bid.objects.filter(auction=OuterRef("pk")).order_by("-amount").values("amount")[:1]
+    auctions.update(current_price=Greatest(F("current_price"), Subquery(top)))
+    rebuild_bid_summaries(auctions)
+
+
+def import_bids(rows, batch_size=BATCH_SIZE):
+    """
+    Creates bids from rows and returns (imported, skipped), skipping bids
+    on auctions that do not exist. Once every bid is in, each auction's
+    price, bid count and highest bid are brought up to date with them.
+    """
+    imported, skipped, auction_ids = _import_children(Bid, rows, batch_size, lambda row, auction_id, user_id: Bid(
+        id=_id(row.get("id")), auction_id=auction_id, user_id=user_id, amount=_decimal(row["amount"]),
+    ))
+    # Each auction is rebuilt once, however many batches its bids spanned,
+    # in chunks that keep the id lists under the query parameter limit.
+    auction_ids = sorted(auction_ids)
+    for start in range(0, len(auction_ids), BATCH_SIZE):
+        _refresh_prices(auction_ids[start:start + BATCH_SIZE])
+    invalidate_listings()
+    return imported, skipped
+
+
+def import_comments(rows, batch_size=BATCH_SIZE):
+    """
+    Creates comments from rows and returns (imported, skipped), skipping
+    comments on auctions that do not exist.
+    """
+    imported, skipped, _ = _import_children(Comment, rows, batch_size, lambda row, auction_id, user_id: Comment(
+        id=_id(row.get("id")), auction_id=auction_id, user_id=user_id, content=row["content"],
+    ))
+    return imported, skipped
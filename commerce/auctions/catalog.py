@@ -0,0 +1,119 @@
+"""
+The category catalog: every category with the number of its open
+auctions, for the categories page and the create form.
+
+Categories rarely change, so their list is kept in process memory and
+reloaded only when the version in the cache moves, which invalidate()
+does whenever a category is saved or deleted. Counts change with every
+auction created or closed, so they are kept in the cache, where every
+process sees them, and adjusted with cache.incr() as those changes
+commit instead of being recounted. Counts are keyed by version, so
+invalidate() drops them too; they are recounted on the next read.
+"""
+
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Auction, Category
+
+
+VERSION_KEY = "catalog:version"
+
+# Counts are recounted at least this often, in case an adjustment was lost.
+CACHE_TIMEOUT = getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 60)
+
+# (version, ((id, name), ...)), sorted by name.
+_catalog = (None, ())
+
+
+def _count_key(version, category_id):
+    return f"catalog:{version}:count:{category_id}"
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _rows(version):
+    global _catalog
+    if _catalog[0] != version:
+        # The version is read before the categories, so a change that
+        # commits in between is picked up by the next read.
+        _catalog = (version, tuple(Category.objects.order_by("name").values_list("id", "name")))
+    return _catalog[1]
+
+
+def invalidate():
+    """
+    Makes every process reload the categories and recount their open
+    auctions, once the current transaction commits.
+    """
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, time.time_ns(), None))
+
+
+def choices():
+    """
+    Returns (id, name) pairs for every category, by name.
+    """
+    return _rows(_version())
+
+
+def get(category_id):
+    """
+    Returns the name of a category, or None if there is no such category.
+    """
+    return dict(choices()).get(category_id)
+
+
+def _recount(version, rows):
+    counts = dict(Auction.objects.filter(is_active=True, category__isnull=False)
+                  .values_list("category").annotate(n=Count("id")).order_by())
+    counts = {_count_key(version, pk): counts.get(pk, 0) for pk, _ in rows}
+    cache.set_many(counts, CACHE_TIMEOUT)
+    return counts
+
+
+def categories():
+    """
+    Returns every category, by name, as dicts with its id, name and
+    count of open auctions. Usually costs two cache reads and no query.
+    """
+    version = _version()
+    rows = _rows(version)
+    counts = cache.get_many([_count_key(version, pk) for pk, _ in rows])
+    if len(counts) < len(rows):
+        counts = _recount(version, rows)
+    return [{"id": pk, "name": name, "count": counts[_count_key(version, pk)]} for pk, name in rows]
+
+
+def adjust(category_ids, delta):
+    """
+    Adds delta to the open auction count of each category in
+    category_ids, once per occurrence, when the current transaction
+    commits. Auctions without a category (None) are ignored.
+    """
+    changes = Counter(pk for pk in category_ids if pk is not None)
+    if not changes:
+        return
+
+    def apply():
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            return
+        for pk, n in changes.items():
+            try:
+                cache.incr(_count_key(version, pk), n * delta)
+            except ValueError:
+                # Not cached: the next read recounts it.
+                pass
+
+    transaction.on_commit(apply)
@@ -0,0 +1,12 @@
+from .watchlists import watch_count
+
+
+def watchlist(request):
+    """
+    Adds watchlist_count, the number of auctions the user watches, for
+    the navbar badge. It is only computed if a template shows it.
+    """
+    user = getattr(request, "user", None)
+    if user is None:
+        return {}
+    return {"watchlist_count": lambda: watch_count(user)}
@@ -0,0 +1,132 @@
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .bidding import close_auctions
+from .models import Auction
+
+
+logger = logging.getLogger(__name__)
+
+# Expired auctions are closed this many at a time, so that one UPDATE
+# never holds the write lock for long.
+BATCH_SIZE = getattr(settings, "AUCTION_EXPIRY_BATCH_SIZE", 500)
+
+# Deadlines up to this far ahead are kept in the scheduler's queue.
+HORIZON = timedelta(seconds=getattr(settings, "AUCTION_EXPIRY_HORIZON", 3600))
+
+# How often the queue is reloaded, to pick up auctions created or closed
+# since it was last read.
+REFRESH_INTERVAL = getattr(settings, "AUCTION_EXPIRY_REFRESH_INTERVAL", 60)
+
+# Upper bound on the number of deadlines held in memory.
+MAX_QUEUED = 10000
+
+
+def close_expired(now=None, batch_size=BATCH_SIZE):
+    """
+    Closes every open auction whose end_time has passed, batch_size at a
+    time, and returns the number closed. Expired auctions are found with
+    the (is_active, end_time) index, so this does not scan the table.
+    """
+    if now is None:
+        now = timezone.now()
+    expired = Auction.objects.filter(is_active=True, end_time__lte=now)
+    closed = 0
+    while True:
+        ids = list(expired.order_by("end_time", "id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return closed
+        closed += close_auctions(Auction.objects.filter(pk__in=ids, end_time__lte=now))
+        if len(ids) < batch_size:
+            return closed
+
+
+class ExpiryScheduler:
+    """
+    Closes auctions as their end_time passes.
+
+    The upcoming deadlines within HORIZON are held in a heap, so the
+    scheduler sleeps until the earliest one instead of polling the
+    table, and reloads the heap every refresh_interval seconds to pick
+    up new auctions. Closing is a conditional UPDATE on is_active, so
+    any number of schedulers, in one process or several, can run at
+    once: each auction is closed by exactly one of them.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, horizon=HORIZON, refresh_interval=REFRESH_INTERVAL):
+        self.batch_size = batch_size
+        self.horizon = horizon
+        self.refresh_interval = timedelta(seconds=refresh_interval)
+        self.queue = []
+        self.next_refresh = None
+        self.stopped = threading.Event()
+
+    def refresh(self, now):
+        upcoming = (Auction.objects
+            .filter(is_active=True, end_time__lte=now + self.horizon)
+            .order_by("end_time", "id").values_list("end_time", "id")[:MAX_QUEUED])
+        # Rows come back sorted, which is already a valid heap.
+        self.queue = list(upcoming)
+        self.next_refresh = now + self.refresh_interval
+
+    def run_pending(self, now=None):
+        """
+        Closes the auctions in the queue whose deadline has passed and
+        returns the number closed, reloading the queue first if due.
+        """
+        if now is None:
+            now = timezone.now()
+        if self.next_refresh is None or now >= self.next_refresh:
+            self.refresh(now)
+        due = []
+        while self.queue and self.queue[0][0] <= now:
+            due.append(heapq.heappop(self.queue)[1])
+        closed = 0
+        for start in range(0, len(due), self.batch_size):
+            ids = due[start:start + self.batch_size]
+            closed += close_auctions(Auction.objects.filter(pk__in=ids, end_time__lte=now))
+        # The queue was truncated at MAX_QUEUED: there may be more due.
+        if len(due) == MAX_QUEUED:
+            self.next_refresh = now
+        return closed
+
+    def seconds_until_next(self, now=None):
+        if now is None:
+            now = timezone.now()
+        wake = self.next_refresh
+        if self.queue:
+            wake = min(wake, self.queue[0][0])
+        return max((wake - now).total_seconds(), 0)
+
+    def run(self):
+        """
+        Closes auctions as they expire until stop() is called.
+        """
+        while not self.stopped.is_set():
+            close_old_connections()
+            try:
+                closed = self.run_pending()
+            except Exception:
+                logger.exception("Closing expired auctions failed")
+                self.next_refresh = timezone.now() + self.refresh_interval
+                closed = 0
+            if closed:
+                logger.info("Closed %d expired auctions", closed)
+            self.stopped.wait(self.seconds_until_next())
+
+    def start(self):
+        """
+        Runs the scheduler in a daemon thread of the current process.
+        """
+        thread = threading.Thread(target=self.run, name="auction-expiry", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stopped.set()
@@ -1,4 +1,5 @@
 from django import forms
+from . import catalog
 from .models import Auction, Bid, Comment, Category
 
 DURATION_CHOICES = [
@@ -23,3 +24,10 @@ class AuctionForm(forms.ModelForm):
     class Meta:
         model = Auction
         fields = ['title', 'description', 'starting_price', 'image', 'category']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Render the choices from the cached catalog; the queryset is
+        # only queried to validate a submitted category.
+        field = self.fields['category']
+        field.choices = [("", field.empty_label), *catalog.choices()]
@@ -0,0 +1,168 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .storage import is_content_addressed
+
+
+logger = logging.getLogger(__name__)
+
+# Widths of the generated variants. The listing grid shows images 250px
+# wide and the listing page 300px; the larger ones serve HiDPI screens.
+VARIANT_WIDTHS = tuple(getattr(settings, "AUCTION_IMAGE_WIDTHS", (250, 500, 750)))
+
+# Each variant is written in both formats: WebP for browsers that
+# support it and JPEG as the fallback.
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+WORKERS = getattr(settings, "AUCTION_IMAGE_WORKERS", 2)
+
+_pool = None
+_pool_guard = threading.Lock()
+
+
+def variant_name(name, width, extension):
+    """
+    Returns the storage name of a variant, next to the original:
+    auction_images/lamp.jpg -> auction_images/lamp.250w.webp
+    """
+    stem, _ = os.path.splitext(name)
+    return f"{stem}.{width}w.{extension}"
+
+
+def srcset(name, widths, extension):
+    """
+    Returns a srcset attribute listing the variants of an image that
+    were generated, or "" if there are none yet.
+    """
+    return ", ".join(
+        f"{default_storage.url(variant_name(name, width, extension))} {width}w"
+        for width in widths
+    )
+
+
+def image_sources(name, widths):
+    """
+    Returns the src, srcset and WebP srcset to show the image stored
+    under name with. Until its variants exist, that is the original.
+    """
+    if not widths:
+        return {"src": default_storage.url(name), "srcset": "", "webp_srcset": ""}
+    return {
+        "src": default_storage.url(variant_name(name, widths[0], "jpg")),
+        "srcset": srcset(name, widths, "jpg"),
+        "webp_srcset": srcset(name, widths, "webp"),
+    }
+
+
+def fit(size, box):
+    """
+    Returns the size an image of size shrinks to, keeping its aspect
+    ratio, to fit in box. Images are never enlarged.
+    """
+    width, height = size
+    scale = min(box[0] / width, box[1] / height, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def generate_variants(name, storage=default_storage):
+    """
+    Writes the resized WebP and JPEG variants of the image stored under
+    name and returns the widths that were generated. Each variant is
+    recorded under the width it really has: an image narrower than a
+    width, or too tall for it, is not enlarged, so its variant is
+    narrower, and widths that would only repeat it are skipped.
+    """
+    with storage.open(name) as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "transparency" in original.info else "RGB")
+
+    widths = []
+    for width in VARIANT_WIDTHS:
+        size = fit(original.size, (width, width * 4))
+        width = size[0]
+        if widths and width <= widths[-1]:
+            break
+        targets = [variant_name(name, width, extension) for extension in FORMATS]
+        if is_content_addressed(name) and all(storage.exists(target) for target in targets):
+            # Made for another auction sharing this image.
+            widths.append(width)
+            continue
+        resized = original.resize(size, Image.LANCZOS, reducing_gap=3.0)
+        for extension, (image_format, options) in FORMATS.items():
+            image = resized.convert("RGB") if image_format == "JPEG" else resized
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, **options)
+            target = variant_name(name, width, extension)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+        widths.append(width)
+    return widths
+
+
+def process_auction_image(auction_id):
+    """
+    Generates the variants of an auction's image and records their
+    widths on the auction, so that pages start serving them.
+    """
+    from .listings import invalidate_listings
+    from .models import Auction
+
+    name = Auction.objects.filter(pk=auction_id).values_list("image", flat=True).first()
+    if not name:
+        return []
+    widths = generate_variants(name)
+    # Only record them if the image was not replaced meanwhile.
+    if Auction.objects.filter(pk=auction_id, image=name).update(image_variants=widths):
+        invalidate_listings()
+    return widths
+
+
+def _work(auction_id):
+    try:
+        return process_auction_image(auction_id)
+    except Exception:
+        logger.exception("Could not generate image variants for auction %s", auction_id)
+        return []
+    finally:
+        close_old_connections()
+
+
+def process_in_pool(auction_ids):
+    """
+    Generates the image variants of several auctions in the worker
+    pool and yields the widths generated for each, in order.
+    """
+    return _get_pool().map(_work, auction_ids)
+
+
+def _get_pool():
+    global _pool
+    with _pool_guard:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="auction-images")
+        return _pool
+
+
+def schedule_variants(auction):
+    """
+    Generates the image variants of auction in the worker pool once the
+    current transaction commits. Until they are ready pages show the
+    original image.
+    """
+    if auction.image:
+        transaction.on_commit(lambda: _get_pool().submit(_work, auction.pk))
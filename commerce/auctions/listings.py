@@ -0,0 +1,122 @@
+import time
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.db.models.functions import Substr
+
+from .images import image_sources
+from .models import Auction
+
+
+PAGE_SIZE = 24
+CACHE_TIMEOUT = 300
+SUMMARY_LENGTH = 200
+
+GENERATION_KEY = "listings:generation"
+
+
+def generation():
+    """
+    Returns the current listings generation, which invalidate_listings()
+    moves. Caches of anything listed key their entries by it.
+    """
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def _price_key(auction_id):
+    return f"listings:price:{auction_id}"
+
+
+def invalidate_listings():
+    """
+    Drops every cached listings page, after an auction was created or
+    closed. Pages are keyed by a generation number, so this is O(1).
+    """
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def record_price(auction_id, price):
+    """
+    Updates the price shown for an auction on cached listings pages,
+    after it was outbid, without invalidating the pages themselves.
+    """
+    cache.set(_price_key(auction_id), price, CACHE_TIMEOUT)
+
+
+def encode_cursor(card):
+    end_time = card["end_time"].isoformat() if card["end_time"] else ""
+    return f"{end_time},{card['id']}"
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (end_time, id) pair encoded by encode_cursor, or None if
+    the cursor is malformed.
+    """
+    try:
+        end_time, auction_id = cursor.rsplit(",", 1)
+        return (datetime.fromisoformat(end_time) if end_time else None), int(auction_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _after(cursor):
+    end_time, auction_id = cursor
+    if end_time is None:
+        return Q(end_time__isnull=True, id__gt=auction_id) | Q(end_time__isnull=False)
+    return Q(end_time__gt=end_time) | Q(end_time=end_time, id__gt=auction_id)
+
+
+def _load_page(category_id, cursor):
+    listings = Auction.objects.filter(is_active=True)
+    if category_id is not None:
+        listings = listings.filter(category_id=category_id)
+    if cursor is not None:
+        listings = listings.filter(_after(cursor))
+    rows = list(listings
+        .order_by(F("end_time").asc(nulls_first=True), "id")
+        .annotate(summary=Substr("description", 1, SUMMARY_LENGTH))
+        .values("id", "title", "summary", "image", "image_variants", "starting_price", "current_price", "end_time")
+        [:PAGE_SIZE + 1])
+
+    cards = []
+    for row in rows[:PAGE_SIZE]:
+        row["image"] = image_sources(row["image"], row.pop("image_variants")) if row["image"] else None
+        row["truncated"] = len(row["summary"]) == SUMMARY_LENGTH
+        cards.append(row)
+    next_cursor = encode_cursor(cards[-1]) if len(rows) > PAGE_SIZE else None
+    return cards, next_cursor
+
+
+def active_listings(category_id=None, cursor=None):
+    """
+    Returns one page of active auctions, ordered by end time, and the
+    cursor of the next page (None on the last page).
+
+    Pages are found with keyset pagination on (end_time, id), so every
+    page costs the same whatever its position, and only the columns a
+    listing card shows are read. Pages are cached until an auction is
+    created or closed. Prices are kept current by record_price.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    cursor = encode_cursor(dict(zip(("end_time", "id"), position))) if position else ""
+    key = f"listings:{generation()}:{category_id}:{cursor}"
+    page = cache.get(key)
+    if page is None:
+        page = _load_page(category_id, position)
+        cache.set(key, page, CACHE_TIMEOUT)
+        for card in page[0]:
+            # add() so a price recorded by a newer bid is not overwritten.
+            cache.add(_price_key(card["id"]), card["current_price"], CACHE_TIMEOUT)
+
+    cards, next_cursor = page
+    prices = cache.get_many([_price_key(card["id"]) for card in cards])
+    for card in cards:
+        card["current_price"] = prices.get(_price_key(card["id"]), card["current_price"])
+        card["price"] = card["current_price"] if card["current_price"] > 0 else card["starting_price"]
+    return cards, next_cursor
@@ -0,0 +1,80 @@
+import asyncio
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from auctions.pubsub import InMemoryBroker, auction_channel
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests live bid fan-out: opens thousands of idle subscribers "
+        "per auction, publishes bids from another thread as the bid views "
+        "do, and reports delivery latency and memory per subscriber."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=5000, help="Subscribers per auction.")
+        parser.add_argument("--auctions", type=int, default=4)
+        parser.add_argument("--bids", type=int, default=50, help="Bids published per auction.")
+        parser.add_argument("--interval", type=float, default=0.1, help="Seconds between bids on an auction.")
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(
+            options["subscribers"], options["auctions"], options["bids"], options["interval"]
+        ))
+
+    async def run(self, per_auction, auctions, bids, interval):
+        broker = InMemoryBroker()
+        total = per_auction * auctions
+        latencies = []
+        received = 0
+        done = asyncio.Event()
+
+        async def subscriber(subscription):
+            nonlocal received
+            for _ in range(bids):
+                # With a timeout, as the event stream waits between heartbeats.
+                message = await subscription.get(timeout=15)
+                latencies.append(time.perf_counter() - message["sent"])
+                received += 1
+                if received == total * bids:
+                    done.set()
+            subscription.close()
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        subscriptions = [broker.subscribe(auction_channel(auction))
+                         for auction in range(auctions) for _ in range(per_auction)]
+        per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / total
+        tracemalloc.stop()
+        tasks = [asyncio.create_task(subscriber(subscription)) for subscription in subscriptions]
+        await asyncio.sleep(0)
+
+        def publish():
+            for number in range(bids):
+                for auction in range(auctions):
+                    broker.publish(auction_channel(auction),
+                                   {"type": "bid", "price": str(number), "sent": time.perf_counter()})
+                time.sleep(interval)
+
+        start = time.perf_counter()
+        publisher = threading.Thread(target=publish)
+        publisher.start()
+        await done.wait()
+        elapsed = time.perf_counter() - start
+        publisher.join()
+        await asyncio.gather(*tasks)
+
+        latencies.sort()
+        self.stdout.write(f"Subscribers:       {total} ({per_auction} per auction, {auctions} auctions)")
+        self.stdout.write(f"Memory:            {per_subscriber:.0f} bytes per idle subscriber")
+        self.stdout.write(f"Bids:              {bids} per auction, one every {interval * 1000:.0f} ms")
+        self.stdout.write(f"Messages:          {received} delivered in {elapsed:.2f} s "
+                          f"({received / elapsed:,.0f}/s)")
+        self.stdout.write(f"Delivery latency:  median {statistics.median(latencies) * 1000:.1f} ms, "
+                          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, "
+                          f"max {latencies[-1] * 1000:.1f} ms")
@@ -0,0 +1,126 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from auctions.listings import PAGE_SIZE
+from auctions.models import Auction, Category, User
+
+
+# The schema before migration 0014: a Listing table with an indexed
+# foreign key to both sides, and full rather than partial indexes on
+# (category, is_active, end_time, id) and (is_active, end_time, id).
+BEFORE_SCHEMA = [
+    "CREATE TABLE bench_listing (id integer PRIMARY KEY, auction_id integer NOT NULL, category_id integer NULL)",
+    "CREATE INDEX bench_listing_auction_id ON bench_listing (auction_id)",
+    "CREATE INDEX bench_listing_category_id ON bench_listing (category_id)",
+    "INSERT INTO bench_listing (auction_id, category_id) SELECT id, category_id FROM auctions_auction",
+    "DROP INDEX auction_open_end_time_idx",
+    "DROP INDEX auction_open_category_idx",
+    "CREATE INDEX bench_auction_open ON auctions_auction (is_active, end_time, id)",
+    "CREATE INDEX bench_auction_category_open ON auctions_auction (category_id, is_active, end_time, id)",
+    "ANALYZE",
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the cost of the first page of category_listings before "
+        "and after Listing was merged into Auction.category, on a seeded "
+        "fixture inserted in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=200_000)
+        parser.add_argument("--categories", type=int, default=50)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options, random.Random(options["seed"]))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options, rng):
+        owner = User.objects.create_user("bench-categories-owner")
+        categories = [Category.objects.create(name=f"bench-categories-{i}").id
+                      for i in range(options["categories"])]
+        # A few large categories and many small ones.
+        weights = [1 / (rank + 1) for rank in range(len(categories))]
+        now = timezone.now()
+        table = Auction._meta.db_table
+        with connection.cursor() as cursor:
+            for offset in range(0, options["listings"], 10000):
+                rows = []
+                for _ in range(min(10000, options["listings"] - offset)):
+                    rows.append((
+                        "Lamp", "A lamp", now, now + timedelta(hours=rng.uniform(-24 * 7, 24 * 7)),
+                        owner.id, "10.00", "10.00", rng.random() < 0.7,
+                        rng.choices(categories, weights)[0], 0, "[]",
+                    ))
+                cursor.executemany(
+                    f"INSERT INTO {table} (title, description, start_time, end_time, owner_id, "
+                    "starting_price, current_price, is_active, category_id, bid_count, image_variants) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    rows,
+                )
+            cursor.execute(f"ANALYZE {table}")
+
+        # The query of a category_listings page, as in listings.py.
+        def page(auctions):
+            return (auctions.filter(is_active=True)
+                .order_by(F("end_time").asc(nulls_first=True), "id")
+                .values("id", "title", "end_time", "current_price")[:PAGE_SIZE + 1])
+
+        def by_category(category):
+            return page(Auction.objects.filter(category_id=category))
+
+        def by_listing(category):
+            return page(Auction.objects.extra(
+                tables=["bench_listing"],
+                where=["bench_listing.auction_id = auctions_auction.id", "bench_listing.category_id = %s"],
+                params=[category],
+            ))
+
+        self.stdout.write(f"Fixture: {options['listings']} listings in {len(categories)} categories")
+        self.measure("after, Auction.category", by_category, categories, options["queries"], rng)
+
+        with connection.cursor() as cursor:
+            for statement in BEFORE_SCHEMA:
+                cursor.execute(statement)
+        self.measure("before, Auction.category", by_category, categories, options["queries"], rng)
+        self.measure("before, via Listing", by_listing, categories, options["queries"], rng)
+
+    def measure(self, label, query, categories, queries, rng):
+        with connection.cursor() as cursor:
+            sql, params = query(categories[0]).query.sql_with_params()
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = "; ".join(row[-1] for row in cursor.fetchall())
+        for category in categories:
+            list(query(category))
+        timings = {"largest category": [], "any category": []}
+        for _ in range(queries):
+            for name, category in (("largest category", categories[0]), ("any category", rng.choice(categories))):
+                start = time.perf_counter()
+                list(query(category))
+                timings[name].append(time.perf_counter() - start)
+        self.stdout.write(f"{label}: {plan}")
+        for name, values in timings.items():
+            values.sort()
+            self.stdout.write(
+                f"  {name:<18} p50 {statistics.median(values) * 1000:6.2f} ms   "
+                f"p95 {values[int(len(values) * 0.95)] * 1000:6.2f} ms"
+            )
+
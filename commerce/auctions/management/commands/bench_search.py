@@ -0,0 +1,95 @@
+import itertools
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from auctions import search
+from auctions.models import Auction, Category, User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures search and facet latency on a synthetic fixture of open "
+        "auctions, inserted in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options["listings"], options["queries"], random.Random(options["seed"]))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, listings, queries, rng):
+        # A Zipf-like vocabulary, so that some words match a large share
+        # of the listings and most match only a few.
+        vocabulary = [f"w{i}" for i in range(20000)]
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        owner = User.objects.create_user("bench-search-owner")
+        categories = [Category.objects.create(name=f"bench-search-{i}").id for i in range(20)]
+        now = timezone.now()
+
+        start = time.perf_counter()
+        table = Auction._meta.db_table
+        with connection.cursor() as cursor:
+            for offset in range(0, listings, 10000):
+                rows = []
+                for _ in range(min(10000, listings - offset)):
+                    price = f"{rng.uniform(1, 1000):.2f}"
+                    rows.append((
+                        " ".join(rng.choices(vocabulary, cum_weights=weights, k=5)),
+                        " ".join(rng.choices(vocabulary, cum_weights=weights, k=30)),
+                        now, now + timedelta(hours=rng.uniform(0, 24 * 7)), owner.id,
+                        price, price, True, rng.choice(categories), 0, "[]",
+                    ))
+                cursor.executemany(
+                    f"INSERT INTO {table} (title, description, start_time, end_time, owner_id, "
+                    "starting_price, current_price, is_active, category_id, bid_count, image_variants) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    rows,
+                )
+        search.rebuild_index()
+        self.stdout.write(f"Fixture:  {listings} listings indexed in {time.perf_counter() - start:.0f} s")
+
+        def measure(label, run):
+            timings = []
+            for _ in range(queries):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            self.stdout.write(
+                f"{label:<34} p50 {statistics.median(timings) * 1000:6.1f} ms   "
+                f"p95 {timings[int(len(timings) * 0.95)] * 1000:6.1f} ms"
+            )
+
+        def word(low, high):
+            return vocabulary[rng.randrange(low, high)]
+
+        measure("search, rare word", lambda: search.search(word(2000, 20000)))
+        measure("search, common word", lambda: search.search(word(20, 200)))
+        measure("search, two words", lambda: search.search(f"{word(0, 2000)} {word(0, 2000)}"))
+        measure("search, prefix", lambda: search.search(word(0, 20000)[:4]))
+        measure("search, word + facet filters", lambda: search.search(
+            word(20, 2000), category=rng.choice(categories), max_price=500, ending_soon=True,
+        ))
+        measure("facets, rare word, uncached", lambda: search._count_facets(word(2000, 20000)))
+        measure("facets, common word, uncached", lambda: search._count_facets(word(20, 200)))
+        common = word(20, 200)
+        search.facets(common)
+        measure("facets, common word, cached", lambda: search.facets(common))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from auctions.expiry import BATCH_SIZE, REFRESH_INTERVAL, ExpiryScheduler, close_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Closes auctions whose end time has passed and picks their winners. "
+        "Runs until interrupted unless --once is given; several instances "
+        "can run at the same time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Close the auctions that have already expired and exit.",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--refresh-interval", type=int, default=REFRESH_INTERVAL,
+            help="Seconds between reloads of the upcoming deadlines.",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            closed = close_expired(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Closed {closed} expired auctions."))
+            return
+
+        scheduler = ExpiryScheduler(
+            batch_size=options["batch_size"],
+            refresh_interval=options["refresh_interval"],
+        )
+        self.stdout.write("Closing auctions as they expire. Press CTRL-C to stop.")
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            scheduler.stop()
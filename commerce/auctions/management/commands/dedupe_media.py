@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auctions.images import process_in_pool
+from auctions.models import Auction
+from auctions.storage import is_content_addressed
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves auction images uploaded before content-addressed storage under "
+        "their content hash, so identical images share one file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete-originals", action="store_true",
+            help="Delete the old files once no auction refers to them.",
+        )
+
+    def handle(self, *args, **options):
+        storage = Auction.image.field.storage
+        moved = {}
+        for auction in Auction.objects.exclude(image="").exclude(image=None).only("id", "image"):
+            old = auction.image.name
+            if is_content_addressed(old):
+                continue
+            if old not in moved and not storage.exists(old):
+                self.stderr.write(f"Missing file for auction {auction.id}: {old}")
+                continue
+            # Stored in the transaction that refers to it (see
+            # ContentAddressedStorage).
+            with transaction.atomic():
+                if old not in moved:
+                    with storage.open(old) as f:
+                        moved[old] = storage.save(old, f)
+                Auction.objects.filter(pk=auction.pk).update(image=moved[old], image_variants=[])
+
+        new_ids = list(Auction.objects.filter(image__in=moved.values()).values_list("id", flat=True))
+        list(process_in_pool(new_ids))
+
+        if options["delete_originals"]:
+            for old in moved:
+                if not Auction.objects.filter(image=old).exists():
+                    storage.delete(old)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {len(moved)} files into {len(set(moved.values()))} content-addressed files."
+        ))
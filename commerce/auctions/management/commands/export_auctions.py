@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions import bulk
+
+
+class Command(BaseCommand):
+    help = "Exports auctions, bids or comments to a JSONL or CSV file (- for stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(bulk.FIELDS))
+        parser.add_argument("file")
+        parser.add_argument("--format", choices=["jsonl", "csv"],
+                            help="Defaults to the file's extension, or jsonl.")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or ("csv" if options["file"].endswith(".csv") else "jsonl")
+        to_stdout = options["file"] == "-"
+        f = sys.stdout if to_stdout else open(options["file"], "w", newline="", encoding="utf-8")
+
+        exported = 0
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                yield row
+
+        start = time.perf_counter()
+        try:
+            bulk.write_rows(f, fmt, bulk.FIELDS[options["kind"]], counted(bulk.export_rows(options["kind"])))
+        finally:
+            if not to_stdout:
+                f.close()
+        elapsed = time.perf_counter() - start
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {exported} {options['kind']} in {elapsed:.1f} s "
+            f"({exported / max(elapsed, 1e-9):,.0f} rows/s)."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from auctions.images import process_in_pool
+from auctions.models import Auction
+
+
+class Command(BaseCommand):
+    help = "Generates the resized WebP and JPEG variants of auction images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Regenerate variants that already exist, e.g. after changing AUCTION_IMAGE_WIDTHS.",
+        )
+
+    def handle(self, *args, **options):
+        auctions = Auction.objects.exclude(image="").exclude(image=None)
+        if not options["all"]:
+            auctions = auctions.filter(image_variants=[])
+        ids = list(auctions.values_list("id", flat=True))
+        done = sum(1 for widths in process_in_pool(ids) if widths)
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {done} of {len(ids)} images."))
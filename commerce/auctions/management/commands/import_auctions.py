@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from auctions import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports auctions, bids or comments from a JSONL or CSV file (- for "
+        "stdin) in batches. Import auctions before their bids and comments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(bulk.FIELDS))
+        parser.add_argument("file")
+        parser.add_argument("--format", choices=["jsonl", "csv"],
+                            help="Defaults to the file's extension, or jsonl.")
+        parser.add_argument("--batch-size", type=int, default=bulk.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or ("csv" if options["file"].endswith(".csv") else "jsonl")
+        try:
+            f = sys.stdin if options["file"] == "-" else open(options["file"], newline="", encoding="utf-8")
+        except OSError as e:
+            raise CommandError(e)
+
+        start = time.perf_counter()
+        with f, transaction.atomic():
+            rows = bulk.read_rows(f, fmt)
+            if options["kind"] == "auctions":
+                imported, skipped = bulk.import_auctions(rows, options["batch_size"]), 0
+            elif options["kind"] == "bids":
+                imported, skipped = bulk.import_bids(rows, options["batch_size"])
+            else:
+                imported, skipped = bulk.import_comments(rows, options["batch_size"])
+        elapsed = time.perf_counter() - start
+
+        message = f"Imported {imported} {options['kind']} in {elapsed:.1f} s ({imported / max(elapsed, 1e-9):,.0f} rows/s)."
+        if skipped:
+            message += f" Skipped {skipped} that refer to missing auctions."
+        self.stdout.write(self.style.SUCCESS(message))
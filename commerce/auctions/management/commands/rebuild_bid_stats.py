@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from auctions.bidding import rebuild_bid_stats, rebuild_bid_summaries
+
+
+class Command(BaseCommand):
+    help = "Recomputes each auction's bid_count and highest_bid, and every BidSummary, from the bids."
+
+    def handle(self, *args, **options):
+        count = rebuild_bid_stats()
+        summaries = rebuild_bid_summaries()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt bid stats for {count} auctions and {summaries} bid summaries."
+        ))
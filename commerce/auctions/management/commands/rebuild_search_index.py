@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auctions.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text auction search index from the Auction table."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} auctions."))
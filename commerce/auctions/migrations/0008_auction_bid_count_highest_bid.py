@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def rebuild_bid_stats(apps, schema_editor):
+    Auction = apps.get_model('auctions', 'Auction')
+    Bid = apps.get_model('auctions', 'Bid')
+    bids = Bid.objects.filter(auction=OuterRef('pk'))
+    Auction.objects.update(
+        bid_count=Coalesce(Subquery(
+            bids.order_by().values('auction').annotate(n=Count('pk')).values('n')
+        ), 0),
+        highest_bid=Subquery(bids.order_by('-amount', '-pk').values('pk')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0007_alter_auction_end_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auction',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='auction',
+            name='highest_bid',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='auctions.bid'),
+        ),
+        migrations.RunPython(rebuild_bid_stats, migrations.RunPython.noop),
+    ]
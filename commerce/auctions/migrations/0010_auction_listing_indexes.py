@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0009_bid_comment_auction_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['is_active', 'end_time', 'id'], name='auctions_au_is_acti_e6dfe7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['category', 'is_active', 'end_time', 'id'], name='auctions_au_categor_eb7d4b_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:24
+
+import auctions.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0011_auction_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auction',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=auctions.storage.ContentAddressedStorage(), upload_to='auction_images/'),
+        ),
+    ]
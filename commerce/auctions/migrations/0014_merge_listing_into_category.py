@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:14
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def merge_listings(apps, schema_editor):
+    # Auction.category is what the site shows, so it wins; a Listing row
+    # only fills in a missing category, the newest one if there are several.
+    Auction = apps.get_model('auctions', 'Auction')
+    Listing = apps.get_model('auctions', 'Listing')
+    newest = (Listing.objects.filter(auction=OuterRef('pk'), category__isnull=False)
+              .order_by('-id').values('category')[:1])
+    Auction.objects.filter(category__isnull=True).update(category=Subquery(newest))
+
+
+def split_listings(apps, schema_editor):
+    Auction = apps.get_model('auctions', 'Auction')
+    Listing = apps.get_model('auctions', 'Listing')
+    rows = Auction.objects.filter(category__isnull=False).values_list('id', 'category_id')
+    Listing.objects.bulk_create(
+        [Listing(auction_id=auction_id, category_id=category_id) for auction_id, category_id in rows],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0013_auction_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_listings, split_listings),
+        migrations.DeleteModel(
+            name='Listing',
+        ),
+        migrations.RemoveIndex(
+            model_name='auction',
+            name='auctions_au_is_acti_e6dfe7_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='auction',
+            name='auctions_au_categor_eb7d4b_idx',
+        ),
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['end_time', 'id'], name='auction_open_end_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'end_time', 'id'], name='auction_open_category_idx'),
+        ),
+    ]
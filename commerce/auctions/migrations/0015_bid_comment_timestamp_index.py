@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0014_merge_listing_into_category'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['timestamp'], name='auctions_bi_timesta_bc5647_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['timestamp'], name='auctions_co_timesta_a19c3b_idx'),
+        ),
+    ]
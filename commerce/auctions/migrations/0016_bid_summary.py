@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+
+
+def rebuild_bid_summaries(apps, schema_editor):
+    Bid = apps.get_model('auctions', 'Bid')
+    BidSummary = apps.get_model('auctions', 'BidSummary')
+    rows = (Bid.objects.values('auction', 'user')
+            .annotate(amount=Max('amount'), n=Count('pk'), last=Max('timestamp'),
+                      leader=F('auction__highest_bid__user'))
+            .order_by())
+    batch = []
+    for row in rows.iterator(chunk_size=2000):
+        batch.append(BidSummary(
+            user_id=row['user'], auction_id=row['auction'], amount=row['amount'], bid_count=row['n'],
+            last_bid_at=row['last'], is_leading=row['leader'] == row['user'],
+        ))
+        if len(batch) == 2000:
+            BidSummary.objects.bulk_create(batch)
+            batch = []
+    BidSummary.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0015_bid_comment_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BidSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('bid_count', models.PositiveIntegerField(default=0)),
+                ('last_bid_at', models.DateTimeField()),
+                ('is_leading', models.BooleanField(default=False)),
+                ('auction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bid_summaries', to='auctions.auction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bid_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_bid_at', '-id'], name='bid_summary_user_recent_idx'), models.Index(condition=models.Q(('is_leading', True)), fields=['auction'], name='bid_summary_leader_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'auction'), name='bid_summary_user_auction_uniq')],
+            },
+        ),
+        migrations.RunPython(rebuild_bid_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:44
+
+import re
+
+from django.db import migrations, models
+
+
+CONTENT_ADDRESSED = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[^/]*)?$")
+
+
+def add_blobs(apps, schema_editor):
+    Auction = apps.get_model('auctions', 'Auction')
+    ImageBlob = apps.get_model('auctions', 'ImageBlob')
+    names = Auction.objects.exclude(image='').exclude(image=None).values_list('image', flat=True).distinct()
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=name) for name in names.iterator() if CONTENT_ADDRESSED.search(name)],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0016_bid_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.RunPython(add_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:05
+
+import auctions.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0017_image_blob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auction',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=auctions.storage.ContentAddressedStorage(), upload_to='auction_images/'),
+        ),
+    ]
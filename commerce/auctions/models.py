@@ -3,6 +3,8 @@ from django.db import models
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+from .storage import content_addressed_storage
+
 
 
 class User(AbstractUser):
@@ -25,9 +27,24 @@ class Auction(models.Model):
     current_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), validators=[MinValueValidator(Decimal('1.00'))])
     is_active = models.BooleanField(default=True)
     winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='won_auctions')
-    image = models.ImageField(upload_to='auction_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='auction_images/', storage=content_addressed_storage, blank=True, null=True, db_index=True)
+    # Widths of the resized variants of image, written by images.py.
+    image_variants = models.JSONField(default=list, blank=True)
     category = models.ForeignKey('Category', on_delete=models.CASCADE, related_name='auctions', null=True, blank=True)
+    # Maintained by the bid engine in bidding.py; rebuild with `manage.py rebuild_bid_stats`.
+    bid_count = models.PositiveIntegerField(default=0)
+    highest_bid = models.ForeignKey('Bid', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
 
+    class Meta:
+        # Partial indexes on the open auctions, in the order listings.py
+        # pages them. Django writes is_active=True as a bare "is_active"
+        # condition, which SQLite cannot match to an index column, only
+        # to an index with the same WHERE clause.
+        indexes = [
+            models.Index(fields=['end_time', 'id'], condition=models.Q(is_active=True), name='auction_open_end_time_idx'),
+            models.Index(fields=['category', 'end_time', 'id'], condition=models.Q(is_active=True), name='auction_open_category_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -39,7 +56,22 @@ class Auction(models.Model):
         return current + Decimal('0.01')
 
     def get_bid_count(self):
-        return self.bids.count()
+        return self.bid_count
+
+    def get_image_sources(self):
+        from .images import image_sources
+        return image_sources(self.image.name, self.image_variants)
+
+class ImageBlob(models.Model):
+    """
+    One row per content-addressed image file, locked by uploads of it and
+    by its garbage collection so that the two never interleave (see
+    ContentAddressedStorage.save and signals.release_image).
+    """
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
 
 class Bid(models.Model):
     auction = models.ForeignKey(Auction, on_delete=models.CASCADE, related_name='bids')
@@ -47,16 +79,50 @@ class Bid(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('1.00'))])
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['auction', 'timestamp']),
+            models.Index(fields=['timestamp']),
+        ]
+
     def __str__(self):
         return f'Bid by {self.user.username} on {self.auction.title} for {self.amount}'
     
     def save(self, *args, **kwargs):
-        current_price = self.auction.current_price if self.auction.current_price > 0 else self.auction.starting_price
-        if self.amount <= current_price:
-            raise ValueError("Bid amount must be greater than the current price.")
-        super().save(*args, **kwargs)
-        self.auction.current_price = self.amount
-        self.auction.save()
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        # New bids go through the atomic bid engine, which raises
+        # BidRejected (a ValueError) if the bid is too low.
+        from .bidding import accept_bid
+        accept_bid(self)
+
+
+class BidSummary(models.Model):
+    """
+    One row per user and auction they bid on: their highest bid and
+    whether it leads. Maintained by the bid engine in bidding.py inside
+    each bid's transaction; rebuild with `manage.py rebuild_bid_stats`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bid_summaries')
+    auction = models.ForeignKey(Auction, on_delete=models.CASCADE, related_name='bid_summaries')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    bid_count = models.PositiveIntegerField(default=0)
+    last_bid_at = models.DateTimeField()
+    is_leading = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'auction'], name='bid_summary_user_auction_uniq'),
+        ]
+        indexes = [
+            # The my_bids page, newest first.
+            models.Index(fields=['user', '-last_bid_at', '-id'], name='bid_summary_user_recent_idx'),
+            # The previous leader of an auction, to mark it outbid.
+            models.Index(fields=['auction'], condition=models.Q(is_leading=True), name='bid_summary_leader_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} on {self.auction.title}: {self.amount}'
 
 
 class Comment(models.Model):
@@ -65,6 +131,12 @@ class Comment(models.Model):
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['auction', 'timestamp']),
+            models.Index(fields=['timestamp']),
+        ]
+
     def __str__(self):
         return f'Comment by {self.user.username} on {self.auction.title}'
 
@@ -78,7 +150,3 @@ class Watchlist(models.Model):
 
     def __str__(self):
         return f'{self.user.username} watching {self.auction.title}'
-
-class Listing(models.Model):
-    auction = models.ForeignKey(Auction, on_delete=models.CASCADE, related_name='listings')
-    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='listings', null=True, blank=True)
\ No newline at end of file
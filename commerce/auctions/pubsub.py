@@ -0,0 +1,190 @@
+"""
+Publish/subscribe for live auction updates.
+
+Bids, price changes and closures are published to a channel per auction
+and pushed to the browsers viewing it by views.auction_events. The
+broker is chosen by the AUCTION_PUBSUB_BACKEND setting and must provide:
+
+    subscribe(channel) -> Subscription   (from a running event loop)
+    publish(channel, message) -> int     (from any thread)
+
+where a Subscription has `async get(timeout=None)` and `close()`.
+InMemoryBroker only reaches subscribers in its own process; deployments
+running several ASGI processes need a broker over a shared service.
+"""
+
+import asyncio
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+DEFAULT_BACKEND = "auctions.pubsub.InMemoryBroker"
+
+# Messages a subscriber may fall behind by before the oldest are dropped.
+# Every message carries the auction's full price, so a slow client only
+# ever misses intermediate states.
+MAX_QUEUED = 32
+
+
+def auction_channel(auction_id):
+    return f"auction:{auction_id}"
+
+
+# Timeouts of Subscription.get() are checked this often, by one timer
+# per event loop rather than one per waiting subscriber.
+TICK = 1.0
+
+
+class Subscription:
+
+    def __init__(self, broker, channel, loop, max_queued=MAX_QUEUED):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.messages = deque(maxlen=max_queued)
+        self.waiter = None
+        self.deadline = None
+
+    def deliver(self, message):
+        # Runs on the subscription's event loop.
+        self.messages.append(message)
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self, timeout=None):
+        """
+        Returns the next message, or None if none arrived in timeout
+        seconds (give or take TICK).
+        """
+        if not self.messages:
+            self.waiter = self.loop.create_future()
+            self.deadline = None if timeout is None else self.loop.time() + timeout
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+            if not self.messages:
+                return None
+        return self.messages.popleft()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """
+    Fans messages out to the subscribers of a channel in this process.
+
+    Subscribers are grouped by event loop, so publishing to thousands of
+    subscribers on one loop costs a single thread-safe wake-up of that
+    loop, which then appends the message to each subscriber's queue.
+    Idle subscribers cost a deque and a pending future each; their
+    timeouts are enforced by one ticking timer per loop.
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._loops = {}
+        self._tickers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, max_queued=MAX_QUEUED):
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(self, channel, loop, max_queued)
+        with self._lock:
+            self._channels.setdefault(channel, {}).setdefault(loop, set()).add(subscription)
+            if loop not in self._loops:
+                self._loops[loop] = set()
+                self._tickers[loop] = loop.call_later(TICK, self._tick, loop)
+            self._loops[loop].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            loops = self._channels.get(subscription.channel, {})
+            subscribers = loops.get(subscription.loop, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                loops.pop(subscription.loop, None)
+            if not loops:
+                self._channels.pop(subscription.channel, None)
+            subscriptions = self._loops.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    # Forget the loop, so a closed one is not kept alive.
+                    del self._loops[subscription.loop]
+                    self._tickers.pop(subscription.loop).cancel()
+
+    def _tick(self, loop):
+        now = loop.time()
+        with self._lock:
+            if loop not in self._loops:
+                return
+            expired = [subscription for subscription in self._loops[loop]
+                       if subscription.deadline is not None and subscription.deadline <= now]
+            self._tickers[loop] = loop.call_later(TICK, self._tick, loop)
+        for subscription in expired:
+            waiter = subscription.waiter
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._channels.get(channel, {}).values())
+
+    def publish(self, channel, message):
+        """
+        Sends message to every subscriber of channel and returns how many
+        there were.
+        """
+        with self._lock:
+            groups = [(loop, tuple(subscribers))
+                      for loop, subscribers in self._channels.get(channel, {}).items()]
+        count = 0
+        for loop, subscribers in groups:
+            try:
+                loop.call_soon_threadsafe(_fan_out, subscribers, message)
+            except RuntimeError:
+                # The loop was closed without its subscribers unsubscribing.
+                for subscription in subscribers:
+                    self.unsubscribe(subscription)
+                continue
+            count += len(subscribers)
+        return count
+
+
+def _fan_out(subscribers, message):
+    for subscription in subscribers:
+        subscription.deliver(message)
+
+
+_broker = None
+_broker_guard = threading.Lock()
+
+
+def get_broker():
+    """
+    Returns the broker named by the AUCTION_PUBSUB_BACKEND setting.
+    """
+    global _broker
+    with _broker_guard:
+        if _broker is None:
+            _broker = import_string(getattr(settings, "AUCTION_PUBSUB_BACKEND", DEFAULT_BACKEND))()
+        return _broker
+
+
+def publish_bid(bid):
+    message = {"type": "bid", "auction": bid.auction_id, "price": str(bid.amount)}
+    if type(bid).user.is_cached(bid):
+        message["bidder"] = bid.user.username
+    get_broker().publish(auction_channel(bid.auction_id), message)
+
+
+def publish_closed(auction_ids):
+    broker = get_broker()
+    for auction_id in auction_ids:
+        broker.publish(auction_channel(auction_id), {"type": "closed", "auction": auction_id})
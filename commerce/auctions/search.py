@@ -0,0 +1,234 @@
+"""
+Full-text auction search over title and description, with facets.
+
+On SQLite the text is indexed in the FTS5 table auctions_auction_fts,
+whose rowid is the auction's id. signals.py keeps it in sync when an
+auction is saved or deleted; bulk imports call index_auctions() and
+rebuild_search_index rebuilds it from scratch. On other databases
+search falls back to unranked substring matching.
+"""
+
+import hashlib
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, When
+from django.utils import timezone
+
+from . import listings
+from .models import Auction
+
+
+FTS_TABLE = "auctions_auction_fts"
+
+# A title match counts this many times as much as a description match.
+TITLE_WEIGHT = 10.0
+
+RESULTS_PER_PAGE = 20
+
+ENDING_SOON = timedelta(hours=getattr(settings, "AUCTION_SEARCH_ENDING_SOON_HOURS", 24))
+
+# Upper bounds of the price facet's ranges; the last range is open.
+PRICE_RANGES = tuple(Decimal(edge) for edge in getattr(
+    settings, "AUCTION_SEARCH_PRICE_RANGES", ("10", "50", "100", "500")
+))
+
+# Facet counts are cached per query for this long, as counting every
+# match of a common word is slow; creating or closing an auction drops
+# them at once.
+FACET_CACHE_TIMEOUT = getattr(settings, "AUCTION_SEARCH_FACET_CACHE_TIMEOUT", 60)
+
+_WORD = re.compile(r"\w+")
+
+
+def uses_fts():
+    return connection.vendor == "sqlite"
+
+
+def match_expression(query):
+    """
+    Turns what a buyer typed into an FTS5 query: every word must appear,
+    and the last one may be a prefix, as it is often still being typed.
+    Returns None if the query has no words.
+    """
+    words = _WORD.findall(query.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def index_auctions(auctions):
+    """
+    Adds or replaces the index rows of the given auctions (objects or
+    dicts with id, title and description).
+    """
+    if not uses_fts():
+        return
+    rows = [
+        (a["id"], a["title"], a["description"]) if isinstance(a, dict) else (a.id, a.title, a.description)
+        for a in auctions
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)", rows
+        )
+
+
+def unindex_auction(auction_id):
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [auction_id])
+
+
+def rebuild_index():
+    """
+    Rebuilds the index from the auction table and returns its size.
+    """
+    if not uses_fts():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+            f"SELECT id, title, description FROM {Auction._meta.db_table}"
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        return Auction.objects.count()
+
+
+def _price():
+    return Case(
+        When(current_price__gt=0, then=F("current_price")),
+        default=F("starting_price"),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def _matching(query):
+    """
+    Returns the open auctions matching query, unranked, or None if the
+    query has no words.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return None
+    auctions = Auction.objects.filter(is_active=True)
+    if not uses_fts():
+        for word in _WORD.findall(query):
+            auctions = auctions.filter(Q(title__icontains=word) | Q(description__icontains=word))
+        return auctions
+    return auctions.extra(
+        where=[f"{Auction._meta.db_table}.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)"],
+        params=[expression],
+    )
+
+
+def _filtered(auctions, category=None, min_price=None, max_price=None, ending_soon=False):
+    auctions = auctions.alias(price=_price())
+    if category is not None:
+        auctions = auctions.filter(category_id=category)
+    if min_price is not None:
+        auctions = auctions.filter(price__gte=min_price)
+    if max_price is not None:
+        auctions = auctions.filter(price__lt=max_price)
+    if ending_soon:
+        auctions = auctions.filter(end_time__isnull=False, end_time__lte=timezone.now() + ENDING_SOON)
+    return auctions
+
+
+def _ranked_ids(expression, filters, offset, limit):
+    # The ranked page is read straight from the FTS table, joined to the
+    # filtered auctions, so bm25() is only computed for matching rows. It
+    # must be a join: with "rowid IN (filtered ids)" SQLite looks every
+    # open auction up in the index instead of scanning the matches.
+    filtered = _filtered(Auction.objects.filter(is_active=True), **filters).values("id")
+    subquery, params = filtered.query.sql_with_params()
+    sql = (
+        f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} JOIN ({subquery}) filtered "
+        f"ON filtered.id = {FTS_TABLE}.rowid WHERE {FTS_TABLE} MATCH %s "
+        f"ORDER BY bm25({FTS_TABLE}, %s, 1.0), {FTS_TABLE}.rowid LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, expression, TITLE_WEIGHT, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(query, page=1, per_page=RESULTS_PER_PAGE, **filters):
+    """
+    Returns (auctions, has_more) for one page of the open auctions that
+    match query, best match first, narrowed by the facet filters
+    category, min_price, max_price and ending_soon.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return [], False
+    offset = (page - 1) * per_page
+    if uses_fts():
+        ids = _ranked_ids(expression, filters, offset, per_page + 1)
+    else:
+        ids = list(_filtered(_matching(query), **filters)
+                   .order_by("-start_time").values_list("id", flat=True)[offset:offset + per_page + 1])
+    has_more = len(ids) > per_page
+    ids = ids[:per_page]
+    auctions = Auction.objects.select_related("category").in_bulk(ids)
+    return [auctions[pk] for pk in ids if pk in auctions], has_more
+
+
+def facets(query):
+    """
+    Counts the open auctions matching query per category, per price
+    range and ending soon, for narrowing a search down. Counts ignore
+    the filters already applied, so that each stays a valid choice, and
+    are cached, so that paging and narrowing reuse them.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return {"categories": [], "prices": [], "ending_soon": 0}
+    digest = hashlib.sha1(expression.encode("utf-8")).hexdigest()
+    key = f"search:facets:{listings.generation()}:{digest}"
+    counts = cache.get(key)
+    if counts is None:
+        counts = _count_facets(query)
+        cache.set(key, counts, FACET_CACHE_TIMEOUT)
+    return counts
+
+
+def _count_facets(query):
+    auctions = _matching(query)
+
+    categories = list(auctions.filter(category__isnull=False)
+        .values("category_id", "category__name").annotate(count=Count("id"))
+        .order_by("-count", "category__name"))
+
+    bounds = [None, *PRICE_RANGES, None]
+    ranges = list(zip(bounds, bounds[1:]))
+    price = _price()
+    sums = {}
+    for i, (low, high) in enumerate(ranges):
+        condition = Q()
+        if low is not None:
+            condition &= Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        sums[f"range_{i}"] = Sum(Case(When(condition, then=1), default=0))
+    sums["ending_soon"] = Sum(Case(
+        When(end_time__isnull=False, end_time__lte=timezone.now() + ENDING_SOON, then=1), default=0
+    ))
+    counts = auctions.alias(price=price).aggregate(**sums)
+
+    return {
+        "categories": categories,
+        "prices": [
+            {"min": low, "max": high, "count": counts[f"range_{i}"] or 0}
+            for i, (low, high) in enumerate(ranges)
+        ],
+        "ending_soon": counts["ending_soon"] or 0,
+    }
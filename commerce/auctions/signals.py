@@ -0,0 +1,78 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .images import FORMATS, VARIANT_WIDTHS, variant_name
+from . import catalog, search, watchlists
+from .models import Auction, Category, ImageBlob, Watchlist
+from .storage import is_content_addressed
+
+
+def release_image(name, widths=()):
+    """
+    Deletes a content-addressed image and its variants, of widths and
+    the configured ones, once no auction refers to it any more. The
+    references are counted after the delete commits, so a blob another
+    auction still shares is kept, and with the blob's row taken, so an
+    upload of the same bytes cannot slip in between (see storage.claim).
+    """
+    if not name or not is_content_addressed(name):
+        return
+
+    def collect():
+        with transaction.atomic():
+            ImageBlob.objects.filter(name=name).delete()
+            if Auction.objects.filter(image=name).exists():
+                transaction.set_rollback(True)
+                return
+            Auction.image.field.storage.delete(name)
+            for width in {*widths, *VARIANT_WIDTHS}:
+                for extension in FORMATS:
+                    default_storage.delete(variant_name(name, width, extension))
+
+    transaction.on_commit(collect)
+
+
+@receiver(post_delete, sender=Auction)
+def release_auction_image(sender, instance, **kwargs):
+    release_image(instance.image.name, instance.image_variants)
+
+
+@receiver(post_save, sender=Auction)
+def index_auction(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {"title", "description"} & set(update_fields):
+        search.index_auctions([instance])
+
+
+@receiver(post_delete, sender=Auction)
+def unindex_auction(sender, instance, **kwargs):
+    search.unindex_auction(instance.id)
+
+
+@receiver(post_save, sender=Auction)
+def count_auction(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        if instance.is_active:
+            catalog.adjust([instance.category_id], +1)
+    elif update_fields is None or {"is_active", "category"} & set(update_fields):
+        # An edit may have moved or closed it, from and to what is unknown.
+        catalog.invalidate()
+
+
+@receiver(post_delete, sender=Auction)
+def uncount_auction(sender, instance, **kwargs):
+    if instance.is_active:
+        catalog.adjust([instance.category_id], -1)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reload_catalog(sender, instance, **kwargs):
+    catalog.invalidate()
+
+
+@receiver(post_save, sender=Watchlist)
+@receiver(post_delete, sender=Watchlist)
+def forget_watchlist(sender, instance, **kwargs):
+    watchlists.forget(instance.user_id)
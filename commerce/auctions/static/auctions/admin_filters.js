@@ -0,0 +1,20 @@
+'use strict';
+{
+    const $ = django.jQuery;
+
+    // Reloads the changelist filtered on the object picked in an
+    // autocomplete filter, or unfiltered if it was cleared.
+    $(function() {
+        $('.autocomplete-filter select').on('change', function() {
+            const parameter = this.closest('.autocomplete-filter').dataset.parameter;
+            const url = new URL(window.location.href);
+            if (this.value) {
+                url.searchParams.set(parameter, this.value);
+            } else {
+                url.searchParams.delete(parameter);
+            }
+            url.searchParams.delete('p');
+            window.location.href = url.toString();
+        });
+    });
+}
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# Files named by their content never change, so they can be cached
+# forever by browsers and proxies.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_CONTENT_ADDRESSED = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[^/]*)?$")
+
+
+def is_content_addressed(name):
+    """
+    Returns whether name was given by ContentAddressedStorage, or is a
+    variant of such a file (see images.variant_name).
+    """
+    return bool(_CONTENT_ADDRESSED.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each file under the SHA-256 of its content, so identical
+    uploads share one file:
+
+        auction_images/photo.jpg -> auction_images/3f/3f2a...c9.jpg
+
+    Saving a file that is already stored writes nothing and returns the
+    existing name. Since a name always holds the same bytes, files must
+    only be deleted once nothing refers to them (see signals.py), and a
+    save must run in the transaction that stores the reference to it.
+    """
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(str(name).replace("\\", "/"))
+        extension = os.path.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        claim(name)
+        if not self.exists(name):
+            self._save_new(name, content)
+        return name
+
+    def _save_new(self, name, content):
+        # Written under a temporary name and renamed into place, so a
+        # concurrent upload of the same file never sees it half-written.
+        # Both would write identical bytes, so either rename may win.
+        temporary = self._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+        os.replace(self.path(temporary), self.path(name))
+
+
+def claim(name):
+    """
+    Writes the ImageBlob row of name, which locks it until the current
+    transaction ends. Garbage collection of the file takes the same row
+    first, so either it waits for this upload to commit and then sees
+    the auction that refers to the file, or it has already deleted the
+    file and this upload, checking only after the claim, writes it again.
+    """
+    from .models import ImageBlob
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=name)], update_conflicts=True, unique_fields=["name"], update_fields=["name"],
+    )
+
+
+content_addressed_storage = ContentAddressedStorage()
@@ -1,3 +1,891 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from commerce import settings_production
+
+from . import bulk, catalog, listings, pubsub, search
+from . import views
+from .images import process_auction_image, variant_name
+from .storage import IMMUTABLE_CACHE_CONTROL
+from .expiry import ExpiryScheduler, close_expired
+from .bidding import BidRejected, close_auction, place_bid, rebuild_bid_stats, rebuild_bid_summaries
+from .models import Auction, Bid, BidSummary, Category, Comment, User
+
+
+def make_auction(owner, price="10.00", **kwargs):
+    return Auction.objects.create(
+        title="Lamp",
+        description="A lamp",
+        owner=owner,
+        starting_price=Decimal(price),
+        current_price=Decimal(price),
+        **kwargs
+    )
+
+
+class BidEngineTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.bidder = User.objects.create_user("bidder", password="x")
+        self.auction = make_auction(self.owner)
+
+    def test_accepts_higher_bid_without_reads(self):
+        # savepoint, INSERT, UPDATE, the bid summary's UPDATE, UPDATE and
+        # INSERT (this is the bidder's first bid here), release
+        with self.assertNumQueries(7):
+            bid = place_bid(self.auction, self.bidder, Decimal("12.00"))
+        self.assertIsNotNone(bid.pk)
+        self.assertEqual(self.auction.current_price, Decimal("12.00"))
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_price, Decimal("12.00"))
+
+    def test_rejects_bid_not_above_current_price(self):
+        with self.assertRaisesMessage(BidRejected, "greater than the current price"):
+            place_bid(self.auction, self.bidder, Decimal("10.00"))
+        self.assertFalse(Bid.objects.exists())
+
+    def test_rejects_owner_and_closed_auction(self):
+        with self.assertRaisesMessage(BidRejected, "your own auction"):
+            place_bid(self.auction, self.owner, Decimal("20.00"))
+        Auction.objects.filter(pk=self.auction.pk).update(is_active=False)
+        with self.assertRaisesMessage(BidRejected, "no longer active"):
+            place_bid(self.auction, self.bidder, Decimal("20.00"))
+
+    def test_rejects_amounts_the_column_cannot_hold(self):
+        for amount in ("NaN", "sNaN", "Infinity", "-Infinity", "1e20", "12.005"):
+            with self.subTest(amount=amount):
+                with self.assertRaisesMessage(BidRejected, "valid bid amount"):
+                    place_bid(self.auction, self.bidder, Decimal(amount))
+        self.assertFalse(Bid.objects.exists())
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_price, Decimal("10.00"))
+
+    def test_bid_views_reject_amounts_the_column_cannot_hold(self):
+        self.client.force_login(self.bidder)
+        for amount in ("1e20", "NaN", "Infinity"):
+            with self.subTest(amount=amount):
+                response = self.client.post(f"/listing/{self.auction.pk}/bid/", {"bid_amount": amount})
+                self.assertEqual(response.status_code, 302)
+                response = self.client.post(f"/listing/{self.auction.pk}/", {"bid": "", "bid_amount": amount})
+                self.assertContains(response, "Please enter a valid bid amount.")
+        self.assertEqual(self.client.get("/").status_code, 200)
+        self.assertFalse(Bid.objects.exists())
+
+    def test_bid_save_goes_through_engine(self):
+        Bid.objects.create(auction=self.auction, user=self.bidder, amount=Decimal("11.00"))
+        with self.assertRaises(ValueError):
+            Bid.objects.create(auction=self.auction, user=self.bidder, amount=Decimal("10.50"))
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_price, Decimal("11.00"))
+
+
+class BidStatsTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+        self.auction = make_auction(self.owner)
+
+    def test_bid_path_maintains_count_and_highest_bid(self):
+        place_bid(self.auction, self.alice, Decimal("11.00"))
+        top = place_bid(self.auction.pk, self.bob, Decimal("12.00"))
+        with self.assertRaises(BidRejected):
+            place_bid(self.auction, self.alice, Decimal("11.50"))
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.bid_count, 2)
+        self.assertEqual(self.auction.highest_bid_id, top.pk)
+
+    def test_close_auction_picks_highest_bidder(self):
+        place_bid(self.auction, self.alice, Decimal("11.00"))
+        place_bid(self.auction, self.bob, Decimal("12.00"))
+        self.assertTrue(close_auction(self.auction))
+        self.assertFalse(self.auction.is_active)
+        self.assertEqual(self.auction.winner, self.bob)
+        self.assertFalse(close_auction(self.auction))
+
+    def test_rebuild_bid_stats(self):
+        place_bid(self.auction, self.alice, Decimal("11.00"))
+        top = place_bid(self.auction, self.bob, Decimal("12.00"))
+        Auction.objects.update(bid_count=0, highest_bid=None)
+        call_command("rebuild_bid_stats", stdout=StringIO())
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.bid_count, 2)
+        self.assertEqual(self.auction.highest_bid_id, top.pk)
+
+    def test_place_bid_view(self):
+        self.client.force_login(self.alice)
+        response = self.client.post(f"/listing/{self.auction.pk}/bid/", {"bid_amount": "15.00"})
+        self.assertEqual(response.status_code, 302)
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_price, Decimal("15.00"))
+        self.assertEqual(self.auction.bid_count, 1)
+
+
+class BidSummaryTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+        self.auction = make_auction(self.owner)
+
+    def summaries(self):
+        return {(s.user.username, s.amount, s.bid_count, s.is_leading)
+                for s in BidSummary.objects.select_related("user")}
+
+    def test_bids_keep_highest_bid_and_leader(self):
+        place_bid(self.auction, self.alice, Decimal("11.00"))
+        place_bid(self.auction, self.bob, Decimal("12.00"))
+        with self.assertNumQueries(6):  # no INSERT for alice's second bid
+            place_bid(self.auction, self.alice, Decimal("13.00"))
+        with self.assertRaises(BidRejected):
+            place_bid(self.auction, self.bob, Decimal("12.50"))
+        self.assertEqual(self.summaries(), {
+            ("alice", Decimal("13.00"), 2, True),
+            ("bob", Decimal("12.00"), 1, False),
+        })
+
+    def test_rebuild_matches_bid_path(self):
+        place_bid(self.auction, self.alice, Decimal("11.00"))
+        place_bid(self.auction, self.bob, Decimal("12.00"))
+        expected = self.summaries()
+        BidSummary.objects.all().delete()
+        self.assertEqual(rebuild_bid_summaries(), 2)
+        self.assertEqual(self.summaries(), expected)
+
+    def test_my_bids_page_costs_the_same_however_many_bids(self):
+        other = make_auction(self.owner)
+        place_bid(self.auction, self.alice, Decimal("11.00"))
+        place_bid(other, self.alice, Decimal("20.00"))
+        place_bid(other, self.bob, Decimal("25.00"))
+        close_auction(other)
+        self.client.force_login(self.alice)
+        self.client.get("/bids/")
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get("/bids/")
+        self.assertContains(response, "<strong>winning</strong>", html=True)
+        self.assertContains(response, "lost")
+        self.assertContains(response, "Winning 1 auction ($11.00 bid)")
+        self.assertContains(response, "won 0 ($0.00 spent), lost 1")
+        for amount in range(12, 40):
+            place_bid(self.auction, self.alice if amount % 2 else self.bob, Decimal(amount))
+        with self.assertNumQueries(len(first)):
+            self.client.get("/bids/")
+
+
+class ListingDetailQueryTests(TestCase):
+    """
+    The listing page must cost the same number of queries no matter how
+    many bids and comments the auction has.
+    """
+
+    # session, user, auction with owner/winner/highest bid, watchlist set
+    # (cached afterwards), one page of bids, one page of comments
+    QUERY_BUDGET = 6
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", password="x")
+        self.bidder = User.objects.create_user("bidder", password="x")
+        self.auction = make_auction(self.owner, price="1.00")
+
+    def add_bids(self, count):
+        Bid.objects.bulk_create(
+            Bid(auction=self.auction, user=self.bidder, amount=Decimal(2 + i))
+            for i in range(count)
+        )
+        Comment.objects.bulk_create(
+            Comment(auction=self.auction, user=self.bidder, content=f"Comment {i}")
+            for i in range(count)
+        )
+        rebuild_bid_stats()
+
+    def assert_page_within_budget(self, count):
+        self.add_bids(count)
+        self.client.force_login(self.bidder)
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get(f"/listing/{self.auction.pk}/?bids_page=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["bid_count"], count)
+        return response
+
+    def test_no_bids(self):
+        self.assert_page_within_budget(0)
+
+    def test_ten_bids(self):
+        response = self.assert_page_within_budget(10)
+        self.assertEqual(response.context["bids"], [])
+        self.assertFalse(response.context["more_bids"])
+
+    def test_ten_thousand_bids(self):
+        response = self.assert_page_within_budget(10000)
+        self.assertEqual(len(response.context["bids"]), 10)
+        self.assertTrue(response.context["more_bids"])
+        self.assertEqual(response.context["bids"][0].amount, Decimal(2 + 10000 - 11))
+
+    def test_huge_page_numbers_are_clamped(self):
+        self.client.force_login(self.bidder)
+        huge = "99999999999999999999"
+        response = self.client.get(f"/listing/{self.auction.pk}/?bids_page={huge}&comments_page={huge}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["bids"], [])
+        self.assertEqual(self.client.get(f"/bids/?page={huge}").status_code, 200)
+
+
+class ActiveListingsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", password="x")
+        self.bidder = User.objects.create_user("bidder", password="x")
+        self.auctions = [make_auction(self.owner) for _ in range(listings.PAGE_SIZE + 5)]
+
+    def test_keyset_pages_cover_every_auction_once(self):
+        first, cursor = listings.active_listings()
+        second, last = listings.active_listings(cursor=cursor)
+        self.assertEqual(len(first), listings.PAGE_SIZE)
+        self.assertIsNone(last)
+        self.assertEqual(
+            [card["id"] for card in first + second],
+            [auction.id for auction in self.auctions],
+        )
+
+    def test_cached_page_shows_new_price_after_bid(self):
+        listings.active_listings()
+        with self.captureOnCommitCallbacks(execute=True):
+            place_bid(self.auctions[0], self.bidder, Decimal("15.00"))
+        with self.assertNumQueries(0):
+            cards, _ = listings.active_listings()
+        self.assertEqual(cards[0]["price"], Decimal("15.00"))
+
+    def test_category_page_is_read_in_index_order(self):
+        category = Category.objects.create(name="Lamps")
+        with CaptureQueriesContext(connection) as captured:
+            listings.active_listings(category_id=category.id)
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + captured.captured_queries[-1]["sql"])
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("auction_open_category_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_closing_an_auction_drops_cached_pages(self):
+        listings.active_listings()
+        close_auction(self.auctions[0])
+        cards, _ = listings.active_listings()
+        self.assertNotIn(self.auctions[0].id, [card["id"] for card in cards])
+
+    def test_malformed_cursor_shows_first_page(self):
+        response = self.client.get("/?after=garbage")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["listings"]), listings.PAGE_SIZE)
+
+
+class ExpiryTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.bidder = User.objects.create_user("bidder", password="x")
+        self.now = timezone.now()
+        self.expired = make_auction(self.owner, end_time=self.now - timedelta(minutes=1))
+        self.running = make_auction(self.owner, end_time=self.now + timedelta(minutes=5))
+
+    def test_close_expired_picks_winners_in_batches(self):
+        Auction.objects.filter(pk=self.expired.pk).update(end_time=None)
+        Bid.objects.create(auction=self.expired, user=self.bidder, amount=Decimal("11.00"))
+        Auction.objects.filter(pk=self.expired.pk).update(end_time=self.now - timedelta(minutes=1))
+        others = [make_auction(self.owner, end_time=self.now - timedelta(seconds=i)) for i in range(5)]
+        self.assertEqual(close_expired(now=self.now, batch_size=2), 6)
+        self.expired.refresh_from_db()
+        self.assertFalse(self.expired.is_active)
+        self.assertEqual(self.expired.winner, self.bidder)
+        self.assertFalse(Auction.objects.filter(pk__in=[a.pk for a in others], is_active=True).exists())
+        self.assertTrue(Auction.objects.get(pk=self.running.pk).is_active)
+        self.assertEqual(close_expired(now=self.now), 0)
+
+    def test_scheduler_closes_each_deadline_as_it_passes(self):
+        scheduler = ExpiryScheduler()
+        self.assertEqual(scheduler.run_pending(self.now), 1)
+        self.assertEqual(scheduler.seconds_until_next(self.now), 60)
+        self.assertEqual(scheduler.run_pending(self.now + timedelta(minutes=5)), 1)
+        self.assertFalse(Auction.objects.filter(is_active=True).exists())
+
+    def test_schedulers_do_not_close_an_auction_twice(self):
+        first, second = ExpiryScheduler(), ExpiryScheduler()
+        first.refresh(self.now)
+        second.refresh(self.now)
+        self.assertEqual(first.run_pending(self.now) + second.run_pending(self.now), 1)
+
+    def test_rejects_bid_after_end_time(self):
+        with self.assertRaisesMessage(BidRejected, "no longer active"):
+            place_bid(self.expired, self.bidder, Decimal("50.00"))
+
+
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        cache.clear()
+        buffer = BytesIO()
+        Image.new("RGB", (1200, 900), "red").save(buffer, "PNG")
+        self.auction = make_auction(User.objects.create_user("owner", password="x"))
+        self.auction.image.save("lamp.png", ContentFile(buffer.getvalue()))
+
+    def test_pages_show_original_until_variants_exist(self):
+        cards, _ = listings.active_listings()
+        self.assertEqual(cards[0]["image"]["src"], self.auction.image.url)
+        self.assertEqual(cards[0]["image"]["srcset"], "")
+
+    def test_variants_are_resized_and_served(self):
+        widths = process_auction_image(self.auction.pk)
+        self.assertEqual(widths, [250, 500, 750])
+        with default_storage.open(variant_name(self.auction.image.name, 250, "webp")) as f:
+            self.assertEqual(Image.open(f).size, (250, 188))
+        cards, _ = listings.active_listings()
+        self.assertIn(".500w.webp 500w", cards[0]["image"]["webp_srcset"])
+        self.assertTrue(cards[0]["image"]["src"].endswith(".250w.jpg"))
+        response = self.client.get(f"/listing/{self.auction.pk}/")
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_variants_are_recorded_with_their_real_width(self):
+        for size, expected in (((180, 120), [180]), ((300, 2000), [150, 300])):
+            with self.subTest(size=size):
+                buffer = BytesIO()
+                Image.new("RGB", size, "blue").save(buffer, "PNG")
+                self.auction.image.save(f"{size[0]}.png", ContentFile(buffer.getvalue()))
+                self.assertEqual(process_auction_image(self.auction.pk), expected)
+                for width in expected:
+                    with default_storage.open(variant_name(self.auction.image.name, width, "jpg")) as f:
+                        self.assertEqual(Image.open(f).width, width)
+
+
+class ContentAddressedMediaTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.owner = User.objects.create_user("owner", password="x")
+
+    def upload(self, filename, data=b"same photo"):
+        auction = make_auction(self.owner)
+        auction.image.save(filename, ContentFile(data))
+        return auction
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.upload("a.JPG"), self.upload("b.jpg")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r"^auction_images/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        self.assertNotEqual(self.upload("c.jpg", b"other photo").image.name, first.image.name)
+
+    def test_file_is_deleted_with_its_last_auction(self):
+        first, second = self.upload("a.jpg"), self.upload("b.jpg")
+        name = first.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_reference_check_uses_an_index(self):
+        plan = Auction.objects.filter(image="auction_images/ab/ab.jpg").explain()
+        self.assertIn("INDEX", plan)
+
+    def test_content_addressed_media_is_immutable(self):
+        name = self.upload("a.jpg").image.name
+        response = views.media(RequestFactory().get("/media/" + name), name)
+        self.assertEqual(response["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+
+
+class ImageCollectionRaceTests(TransactionTestCase):
+    """
+    An upload of the same bytes as an image whose last auction is being
+    deleted must never be left pointing at a collected file.
+    """
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a test database that allows several connections")
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def test_upload_during_collection_keeps_the_file(self):
+        owner = User.objects.create_user("owner", password="x")
+        first = make_auction(owner)
+        first.image.save("a.jpg", ContentFile(b"same photo"))
+        storage = Auction.image.field.storage
+        claimed, deleting = threading.Event(), threading.Event()
+        errors = []
+
+        def upload():
+            try:
+                with transaction.atomic():
+                    name = storage.save("auction_images/b.jpg", ContentFile(b"same photo"))
+                    claimed.set()
+                    deleting.wait()
+                    time.sleep(0.3)
+                    make_auction(owner, image=name)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        uploader = threading.Thread(target=upload)
+        uploader.start()
+        claimed.wait()
+        deleting.set()
+        first.delete()
+        uploader.join()
+
+        self.assertEqual(errors, [])
+        second = Auction.objects.get()
+        self.assertTrue(storage.exists(second.image.name))
+
+
+class RecordingBroker:
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+
+class LiveUpdateTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.bidder = User.objects.create_user("bidder", password="x")
+        self.auction = make_auction(self.owner)
+
+    def test_fan_out_reaches_thousands_of_subscribers(self):
+        broker = pubsub.InMemoryBroker()
+
+        async def run():
+            subscriptions = [broker.subscribe("auction:1") for _ in range(2000)]
+            publisher = threading.Thread(target=broker.publish, args=("auction:1", {"price": "12.00"}))
+            publisher.start()
+            messages = await asyncio.gather(*(s.get(timeout=5) for s in subscriptions))
+            publisher.join()
+            idle = await subscriptions[0].get(timeout=0)
+            for subscription in subscriptions:
+                subscription.close()
+            return messages, idle
+
+        messages, idle = asyncio.run(run())
+        self.assertEqual(messages, [{"price": "12.00"}] * 2000)
+        self.assertIsNone(idle)
+        self.assertEqual(broker.subscriber_count("auction:1"), 0)
+
+    def test_bids_and_closure_are_published_after_commit(self):
+        broker = RecordingBroker()
+        with mock.patch.object(pubsub, "_broker", broker):
+            with self.captureOnCommitCallbacks(execute=True):
+                place_bid(self.auction, self.bidder, Decimal("12.00"))
+            with self.captureOnCommitCallbacks(execute=True):
+                close_auction(self.auction)
+        channel = pubsub.auction_channel(self.auction.pk)
+        self.assertEqual(broker.published, [
+            (channel, {"type": "bid", "auction": self.auction.pk, "price": "12.00", "bidder": "bidder"}),
+            (channel, {"type": "closed", "auction": self.auction.pk}),
+        ])
+
+    async def test_event_stream(self):
+        broker = pubsub.InMemoryBroker()
+        with mock.patch.object(pubsub, "_broker", broker):
+            response = await self.async_client.get(f"/listing/{self.auction.pk}/events/")
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            stream = aiter(response.streaming_content)
+            self.assertIn(b'"price": "10.00"', await anext(stream))
+            channel = pubsub.auction_channel(self.auction.pk)
+            broker.publish(channel, {"type": "bid", "auction": self.auction.pk, "price": "12.00"})
+            event = (await anext(stream)).decode()
+            self.assertTrue(event.startswith("event: bid\n"))
+            self.assertEqual(json.loads(event.split("data: ")[1])["price"], "12.00")
+            broker.publish(channel, {"type": "closed", "auction": self.auction.pk})
+            self.assertTrue((await anext(stream)).startswith(b"event: closed"))
+            with self.assertRaises(StopAsyncIteration):
+                await anext(stream)
+            self.assertEqual(broker.subscriber_count(channel), 0)
+
+    def test_event_stream_is_not_held_open_under_wsgi(self):
+        response = self.client.get(f"/listing/{self.auction.pk}/events/")
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(f"/listing/{self.auction.pk}/")
+        self.assertNotContains(response, "EventSource")
+
+    async def test_listing_subscribes_under_asgi(self):
+        response = await self.async_client.get(f"/listing/{self.auction.pk}/")
+        self.assertContains(response, "EventSource")
+
+
+class WatchlistTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", password="x")
+        self.user = User.objects.create_user("watcher", password="x")
+        self.auctions = [make_auction(self.owner, price=f"{10 + i}.00") for i in range(5)]
+        self.client.force_login(self.user)
+
+    def toggle(self, auction):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/listing/{auction.pk}/", {"watchlist": ""})
+
+    def test_toggle_updates_cached_set(self):
+        self.toggle(self.auctions[0])
+        self.toggle(self.auctions[1])
+        response = self.client.get(f"/listing/{self.auctions[0].pk}/")
+        self.assertTrue(response.context["is_watchlisted"])
+        self.toggle(self.auctions[0])
+        response = self.client.get(f"/listing/{self.auctions[0].pk}/")
+        self.assertFalse(response.context["is_watchlisted"])
+        self.assertContains(response, '<span class="badge badge-secondary">1</span>')
+
+    def test_cached_watchlist_costs_no_queries(self):
+        for auction in self.auctions:
+            self.toggle(auction)
+        self.client.get("/watchlist/")
+        # session and user only: no watchlist flag or badge query
+        with self.assertNumQueries(5):
+            self.client.get(f"/listing/{self.auctions[0].pk}/")
+
+    def test_watchlist_page_is_one_query(self):
+        for auction in self.auctions:
+            self.toggle(auction)
+        with self.assertNumQueries(3):  # session, user, watched auctions
+            response = self.client.get("/watchlist/")
+        self.assertContains(response, "$14.00")
+        self.assertEqual(len(response.context["auctions"]), 5)
+
+
+class CatalogTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", password="x")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books = Category.objects.create(name="Books")
+            self.lamps = Category.objects.create(name="Lamps")
+
+    def counts(self):
+        return {category["name"]: category["count"] for category in catalog.categories()}
+
+    def test_counts_follow_creation_and_closing(self):
+        self.assertEqual(self.counts(), {"Books": 0, "Lamps": 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            first = make_auction(self.owner, category=self.lamps)
+            make_auction(self.owner, category=self.lamps)
+            make_auction(self.owner, category=self.books)
+            make_auction(self.owner)
+        self.assertEqual(self.counts(), {"Books": 1, "Lamps": 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            close_auction(first)
+        self.assertEqual(self.counts(), {"Books": 1, "Lamps": 1})
+
+    def test_counts_are_adjusted_not_recounted(self):
+        self.counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_auction(self.owner, category=self.books)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), {"Books": 1, "Lamps": 0})
+
+    def test_new_category_is_listed(self):
+        self.counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Clocks")
+        self.assertEqual(self.counts(), {"Books": 0, "Clocks": 0, "Lamps": 0})
+
+    def test_pages_read_the_catalog(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_auction(self.owner, category=self.books)
+        self.client.force_login(self.owner)
+        self.client.get("/categories/")
+        with self.assertNumQueries(2):  # session, user
+            response = self.client.get("/categories/")
+        self.assertContains(response, "(1 active listing)")
+        with self.assertNumQueries(2):
+            response = self.client.get("/create/")
+        self.assertContains(response, '<option value="%d">Lamps</option>' % self.lamps.id)
+        self.assertEqual(self.client.get("/categories/999/").status_code, 404)
+
+
+class AdminChangelistTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", password="x")
+        self.owner = User.objects.create_user("owner", password="x")
+        self.bidder = User.objects.create_user("bidder", password="x")
+        self.auctions = [make_auction(self.owner) for _ in range(3)]
+        self.client.force_login(self.admin)
+
+    def add_bids(self, count, days_apart=0):
+        bids = Bid.objects.bulk_create(
+            Bid(auction=self.auctions[i % 3], user=self.bidder, amount=Decimal(20 + i))
+            for i in range(count)
+        )
+        for i, bid in enumerate(bids):
+            Bid.objects.filter(pk=bid.pk).update(timestamp=timezone.now() - timedelta(days=days_apart * i))
+
+    def changelist_queries(self, query=""):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f"/admin/auctions/bid/{query}")
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_queries_do_not_grow_with_rows(self):
+        # The date hierarchy costs a query per period with bids; keep to one.
+        self.add_bids(5)
+        few = [self.changelist_queries(), self.changelist_queries(f"?auction__id__exact={self.auctions[0].id}")]
+        self.add_bids(60)
+        many = [self.changelist_queries(), self.changelist_queries(f"?auction__id__exact={self.auctions[0].id}")]
+        self.assertEqual(few, many)
+
+    def test_filter_shows_only_selected_auction(self):
+        self.add_bids(6)
+        response = self.client.get(f"/admin/auctions/bid/?auction__id__exact={self.auctions[1].id}")
+        self.assertEqual(len(response.context["cl"].result_list), 2)
+        self.assertContains(response, 'class="admin-autocomplete"')
+        self.assertContains(response, f'<option value="{self.auctions[1].id}" selected>Lamp</option>')
+        self.assertNotContains(response, f'<option value="{self.auctions[2].id}"')
+        response = self.client.get("/admin/auctions/bid/?auction__id__exact=x")
+        self.assertRedirects(response, "/admin/auctions/bid/?e=1", fetch_redirect_response=False)
+
+    def test_date_hierarchy_lists_periods_with_bids(self):
+        self.add_bids(12, days_apart=40)
+        years = sorted({bid.timestamp.year for bid in Bid.objects.all()})
+        response = self.client.get("/admin/auctions/bid/")
+        for year in years:
+            self.assertContains(response, f"?timestamp__year={year}")
+        months = {bid.timestamp.month for bid in Bid.objects.filter(timestamp__year=years[0])}
+        response = self.client.get(f"/admin/auctions/bid/?timestamp__year={years[0]}")
+        for month in range(1, 13):
+            link = f"?timestamp__month={month}&amp;"
+            (self.assertContains if month in months else self.assertNotContains)(response, link)
+
+
+class BulkImportExportTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = lambda name: f"{directory}/{name}"
+        owner = User.objects.create_user("owner", password="x")
+        bidder = User.objects.create_user("bidder", password="x")
+        self.auction = make_auction(owner, category=Category.objects.create(name="Lamps"))
+        place_bid(self.auction, bidder, Decimal("12.50"))
+        Comment.objects.create(auction=self.auction, user=bidder, content="Nice, lamp")
+
+    def export(self, fmt):
+        for kind in ("auctions", "bids", "comments"):
+            call_command("export_auctions", kind, self.path(f"{kind}.{fmt}"), stderr=StringIO())
+
+    def reimport(self, fmt):
+        Auction.objects.all().delete()
+        User.objects.all().delete()
+        Category.objects.all().delete()
+        out = StringIO()
+        for kind in ("auctions", "bids", "comments"):
+            call_command("import_auctions", kind, self.path(f"{kind}.{fmt}"), batch_size=1, stdout=out)
+        self.assertIn("rows/s", out.getvalue())
+
+    def assert_round_trip(self, fmt):
+        timestamp = self.auction.start_time
+        bid_time = Bid.objects.get().timestamp
+        comment_time = Comment.objects.get().timestamp
+        self.export(fmt)
+        self.reimport(fmt)
+        auction = Auction.objects.select_related("owner", "category", "highest_bid__user").get()
+        self.assertEqual(auction.pk, self.auction.pk)
+        self.assertEqual(auction.start_time, timestamp)
+        self.assertEqual((auction.owner.username, auction.category.name), ("owner", "Lamps"))
+        self.assertEqual(auction.current_price, Decimal("12.50"))
+        self.assertEqual(auction.bid_count, 1)
+        self.assertEqual(auction.highest_bid.user.username, "bidder")
+        self.assertEqual(auction.highest_bid.timestamp, bid_time)
+        self.assertEqual(Comment.objects.get().content, "Nice, lamp")
+        self.assertEqual(Comment.objects.get().timestamp, comment_time)
+        self.assertTrue(Auction._meta.get_field("start_time").auto_now_add)
+
+    def test_jsonl_round_trip(self):
+        self.assert_round_trip("jsonl")
+
+    def test_csv_round_trip(self):
+        self.assert_round_trip("csv")
+
+    def test_imported_bids_raise_current_price(self):
+        with open(self.path("bids.jsonl"), "w") as f:
+            f.write(json.dumps({"auction": self.auction.pk, "user": "newcomer", "amount": "30.00"}) + "\n")
+            f.write(json.dumps({"auction": 9999, "user": "newcomer", "amount": "5.00"}) + "\n")
+        out = StringIO()
+        call_command("import_auctions", "bids", self.path("bids.jsonl"), stdout=out)
+        self.assertIn("Skipped 1", out.getvalue())
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_price, Decimal("30.00"))
+        self.assertEqual(self.auction.bid_count, 2)
+        self.assertFalse(User.objects.get(username="newcomer").has_usable_password())
+
+    def test_prices_are_rebuilt_once_after_the_last_batch(self):
+        with open(self.path("bids.jsonl"), "w") as f:
+            for amount in ("20.00", "25.00", "30.00"):
+                f.write(json.dumps({"auction": self.auction.pk, "user": "newcomer", "amount": amount}) + "\n")
+        with mock.patch.object(bulk, "rebuild_bid_stats", wraps=bulk.rebuild_bid_stats) as rebuild:
+            call_command("import_auctions", "bids", self.path("bids.jsonl"), batch_size=1, stdout=StringIO())
+        self.assertEqual(rebuild.call_count, 1)
+        self.auction.refresh_from_db()
+        self.assertEqual((self.auction.current_price, self.auction.bid_count), (Decimal("30.00"), 4))
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user("owner", password="x")
+        lamps = Category.objects.create(name="Lamps")
+        self.desk = make_auction(owner, price="15.00", category=lamps,
+                                 end_time=timezone.now() + timedelta(hours=2))
+        self.desk.title, self.desk.description = "Brass desk lamp", "Warm light for reading"
+        self.desk.save()
+        self.floor = make_auction(owner, price="120.00", category=lamps)
+        self.floor.title, self.floor.description = "Floor lamp", "Tall, with a dimmer"
+        self.floor.save()
+        self.chair = make_auction(owner, price="60.00")
+        self.chair.title, self.chair.description = "Reading chair", "Goes well with a lamp"
+        self.chair.save()
+
+    def ids(self, query, **filters):
+        results, _ = search.search(query, **filters)
+        return [auction.id for auction in results]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.ids("lamp")[-1], self.chair.id)
+        self.assertEqual(self.ids("readi"), [self.chair.id, self.desk.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.floor.title = "Standing lamp"
+        self.floor.save()
+        self.assertEqual(self.ids("standing"), [self.floor.id])
+        self.floor.delete()
+        self.assertEqual(self.ids("standing"), [])
+        close_auction(self.chair)
+        self.assertNotIn(self.chair.id, self.ids("lamp"))
+
+    def test_facets_and_filters(self):
+        facets = search.facets("lamp")
+        self.assertEqual([(c["category__name"], c["count"]) for c in facets["categories"]], [("Lamps", 2)])
+        self.assertEqual([p["count"] for p in facets["prices"]], [0, 1, 1, 1, 0])
+        self.assertEqual(facets["ending_soon"], 1)
+        self.assertEqual(self.ids("lamp", min_price=Decimal("50"), max_price=Decimal("100")), [self.chair.id])
+        self.assertEqual(self.ids("lamp", ending_soon=True), [self.desk.id])
+        self.assertEqual(len(self.ids("lamp", category=self.desk.category_id)), 2)
+
+    def test_facets_are_counted_once_per_query(self):
+        with mock.patch.object(search, "_count_facets", wraps=search._count_facets) as count:
+            for page in (1, 2):
+                self.client.get("/search/", {"q": "lamp", "page": page})
+            self.client.get("/search/", {"q": "Lamp", "category": self.desk.category_id})
+            self.assertEqual(count.call_count, 1)
+            listings.invalidate_listings()
+            self.assertEqual(search.facets("lamp")["ending_soon"], 1)
+            self.assertEqual(count.call_count, 2)
+
+    def test_search_page(self):
+        response = self.client.get("/search/", {"q": "lamp", "category": self.desk.category_id})
+        self.assertContains(response, "Brass desk lamp")
+        self.assertNotContains(response, "Reading chair</a>")
+        self.assertContains(response, "Ending soon")
+        self.assertEqual(self.client.get("/search/", {"q": '"*)'}).status_code, 200)
+
+    def test_out_of_range_parameters_are_ignored_or_clamped(self):
+        for params in ({"min_price": "NaN"}, {"max_price": "-Infinity"}, {"min_price": "1e400"},
+                       {"category": "9" * 30}, {"category": "-" + "9" * 30}, {"page": "9" * 30}):
+            response = self.client.get("/search/", {"q": "lamp", **params})
+            self.assertEqual(response.status_code, 200, params)
+        response = self.client.get("/search/", {"q": "lamp", "min_price": "NaN"})
+        self.assertContains(response, "Reading chair")
+        response = self.client.get("/search/", {"q": "lamp", "category": "9" * 30})
+        self.assertNotContains(response, "Brass desk lamp")
+
+
+class ConcurrentBiddingTests(TransactionTestCase):
+    """
+    Many threads bid on one auction at once. Whatever order they run in,
+    the final price must equal the highest accepted bid and every
+    accepted bid must have been higher than the one accepted before it.
+    """
+
+    threads = 8
+    bids_per_thread = 25
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a test database that allows several connections")
+
+    def test_no_lost_updates(self):
+        owner = User.objects.create_user("owner", password="x")
+        bidders = [User.objects.create_user(f"bidder{i}", password="x") for i in range(self.threads)]
+        auction = make_auction(owner, price="1.00")
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def bid(user, offset):
+            try:
+                barrier.wait()
+                for i in range(self.bids_per_thread):
+                    amount = Decimal(2 + i * self.threads + offset)
+                    try:
+                        place_bid(auction.pk, user, amount)
+                    except BidRejected:
+                        pass
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=bid, args=(user, i)) for i, user in enumerate(bidders)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        auction.refresh_from_db()
+        accepted = list(Bid.objects.filter(auction=auction).order_by("id").values_list("amount", flat=True))
+        self.assertTrue(accepted)
+        self.assertEqual(auction.current_price, max(accepted))
+        self.assertEqual(accepted, sorted(accepted))
+        self.assertEqual(len(accepted), len(set(accepted)))
+
+
+@override_settings(TEMPLATES=settings_production.TEMPLATES)
+class TemplateReportTests(TestCase):
+
+    def test_report_lists_compile_and_render_times(self):
+        out = StringIO()
+        call_command("template_report", "/login", repeat=2, stdout=out)
+        self.assertRegex(out.getvalue(), r"auctions/login\.html +[\d.]+ms +2 ")
+        self.assertRegex(out.getvalue(), r"auctions/register\.html +[\d.]+ms +0 ")
@@ -12,11 +12,14 @@ urlpatterns = [
     path("listing/<int:auction_id>/", views.listings_details, name="listing_details"),
     path("listing/<int:auction_id>/detail/", views.listings_details, name="auction_detail"),
     path("watchlist/", views.watchlist, name="watchlist"),
+    path("bids/", views.my_bids, name="my_bids"),
+    path("search/", views.search_view, name="search"),
     path("categories/", views.categories, name="categories"),
     path("categories/<int:category_id>/", views.category_listings, name="category_listings"),
     path("listing/<int:auction_id>/bid/", views.place_bid, name="place_bid"),
     path("listing/<int:auction_id>/close/", views.close_auction, name="close_auction"),
+    path("listing/<int:auction_id>/events/", views.auction_events, name="auction_events"),
    
 ]
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, view=views.media)
\ No newline at end of file
@@ -1,22 +1,34 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
-from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect, HttpResponseForbidden
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponse, HttpResponseRedirect, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
+from django.views.static import serve
 from .models import User , Auction, Bid, Comment, Watchlist, Category
 from .forms import AuctionForm
+from . import bidding, catalog, search, watchlists
+from .bidding import BidRejected
+from .images import schedule_variants
+from .listings import active_listings, invalidate_listings
+from .pubsub import auction_channel, get_broker
+from .storage import IMMUTABLE_CACHE_CONTROL, is_content_addressed
 from decimal import Decimal,InvalidOperation
 from django.contrib import messages 
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError 
 from datetime import timedelta
 from django.utils import timezone 
+import json
 
 
 def index(request):
-    listings = Auction.objects.filter(is_active=True)
+    listings, next_cursor = active_listings(cursor=request.GET.get("after"))
     return render(request, "auctions/index.html", {
-        "listings": listings
+        "listings": listings,
+        "next_cursor": next_cursor,
+        "is_first_page": "after" not in request.GET
     })
 
 
@@ -81,7 +93,12 @@ def CreateAuction(request):
             listing.current_price = listing.starting_price
             days = int(form.cleaned_data['duration'])
             listing.end_time = timezone.now() + timedelta(days=days)
-            listing.save()
+            # The image is stored in the transaction that refers to it
+            # (see ContentAddressedStorage).
+            with transaction.atomic():
+                listing.save()
+            invalidate_listings()
+            schedule_variants(listing)
             messages.success(request, "Auction created successfully!")
             return HttpResponseRedirect(reverse("index"))
         else:
@@ -93,40 +110,53 @@ def CreateAuction(request):
         "form": form
     })
 
+BIDS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 10
+
+
+def get_page(queryset, number, per_page):
+    """
+    Returns one page of queryset and whether a next page exists, using a
+    single query that fetches one extra row instead of a COUNT.
+    """
+    start = (number - 1) * per_page
+    items = list(queryset[start:start + per_page + 1])
+    return items[:per_page], len(items) > per_page
+
+
+# Page numbers are clamped to this, so that no OFFSET overflows the
+# database's integers; there are never this many pages of anything.
+MAX_PAGE_NUMBER = 100000
+
+
+def get_page_number(request, name):
+    try:
+        return min(max(1, int(request.GET.get(name, 1))), MAX_PAGE_NUMBER)
+    except ValueError:
+        return 1
+
+
 def listings_details(request, auction_id):
-    auction = get_object_or_404(Auction, id=auction_id)
+    # Everything the template touches is loaded here, so the page costs
+    # the same handful of queries however many bids and comments exist.
+    auction = get_object_or_404(
+        Auction.objects.select_related('owner', 'winner', 'highest_bid__user'),
+        id=auction_id
+    )
     if request.method == "POST"and request.user.is_authenticated:
         if "watchlist" in request.POST:
-            watchlist_item, created = Watchlist.objects.get_or_create(
-                user=request.user,
-                auction=auction
-            )
-  
-            
-            if not created:
-                watchlist_item.delete()  # Remove from watchlist if it already exists
-        
+            watchlists.toggle(request.user, auction)
+
         elif "bid" in request.POST:
-            bid_amount = Decimal(request.POST.get("bid_amount", ))
-            current_price = auction.current_price if auction.current_price > 0 else auction.starting_price
-
-            if bid_amount > auction.starting_price and bid_amount > current_price:
-                Bid.objects.create(
-                    auction=auction,
-                    user=request.user,
-                    amount=bid_amount
-                )
-                auction.current_price = bid_amount
-                auction.save()
-            else:
-                messages.error(request, "Bid amount must be greater than the current price.")
-
-        elif "close_auction" in request.POST and auction.owner == request.user:
-            auction.is_active = False
-            highest_bid = auction.bids.order_by('-amount').first()
-            if highest_bid:
-                auction.winner = highest_bid.user
-            auction.save()
+            try:
+                bidding.place_bid(auction, request.user, Decimal(request.POST.get("bid_amount", "")))
+            except InvalidOperation:
+                messages.error(request, "Please enter a valid bid amount.")
+            except BidRejected as e:
+                messages.error(request, str(e))
+
+        elif "close_auction" in request.POST and auction.owner_id == request.user.id:
+            bidding.close_auction(auction)
 
         elif "comment" in request.POST:
             Comment.objects.create(
@@ -134,20 +164,34 @@ def listings_details(request, auction_id):
                 auction=auction,
                 content=request.POST.get("comment_content")
             )
-    is_watchlisted = False
-    if request.user.is_authenticated:
-        is_watchlisted = Watchlist.objects.filter(user=request.user, auction=auction).exists()
+    is_watchlisted = watchlists.is_watching(request.user, auction.id)
+    bids_page = get_page_number(request, "bids_page")
+    bids, more_bids = get_page(
+        auction.bids.select_related('user').order_by('-timestamp', '-id'),
+        bids_page, BIDS_PER_PAGE
+    )
+    comments_page = get_page_number(request, "comments_page")
+    comments, more_comments = get_page(
+        auction.comments.select_related('user').order_by('timestamp', 'id'),
+        comments_page, COMMENTS_PER_PAGE
+    )
     context = {
         "auction": auction,
         "is_watchlisted": is_watchlisted,
         "watchlist": is_watchlisted,
-        "bids": auction.bids.order_by('-timestamp'),
-        "highest_bid": auction.bids.order_by('-amount').first(),
+        "bids": bids,
+        "bids_page": bids_page,
+        "more_bids": more_bids,
+        "highest_bid": auction.highest_bid,
         "minimum_bid": auction.get_minimum_bid(),
-        "bid_count": auction.get_bid_count(),
-        "comments": auction.comments.all(),
-        "is_owner": request.user == auction.owner if request.user.is_authenticated else False,
-        "is_winner": request.user == auction.winner if request.user.is_authenticated and auction.winner else False,
+        "bid_count": auction.bid_count,
+        "comments": comments,
+        "comments_page": comments_page,
+        "more_comments": more_comments,
+        "is_owner": request.user.is_authenticated and request.user.id == auction.owner_id,
+        "is_winner": request.user.is_authenticated and auction.winner_id is not None and request.user.id == auction.winner_id,
+        # An open event stream would tie up a worker thread under WSGI.
+        "live_updates": isinstance(request, ASGIRequest),
 
     }
     return render(request, "auctions/listing_details.html", context)
@@ -155,28 +199,112 @@ def listings_details(request, auction_id):
 @login_required
 def watchlist(request):
     if request.user.is_authenticated:
-        watchlist_items = Watchlist.objects.filter(user=request.user)
+        auctions = list(watchlists.watched_auctions(request.user))
+        # Also fills the cached set the navbar badge is counted from.
+        watchlists.remember(request.user, [auction.id for auction in auctions])
         return render(request, "auctions/watchlist.html", {
-            "watchlist_items": watchlist_items
+            "auctions": auctions
         })
     else:
         messages.error(request, "You must be logged in to view your watchlist.")
         return HttpResponseRedirect(reverse("login"))
 
+
+BIDS_LEDGER_PER_PAGE = 20
+
+
+@login_required
+def my_bids(request):
+    page = get_page_number(request, "page")
+    summaries, more = get_page(bidding.user_bids(request.user), page, BIDS_LEDGER_PER_PAGE)
+    return render(request, "auctions/my_bids.html", {
+        "summaries": summaries,
+        "page": page,
+        "more": more,
+        "totals": bidding.bid_totals(request.user),
+    })
+
+# The largest value an id column holds; larger ids in a query string are
+# clamped to it, so they match nothing instead of overflowing the query.
+MAX_ID = 2 ** 63 - 1
+
+
+def get_decimal(request, name):
+    try:
+        value = Decimal(request.GET[name])
+    except (KeyError, InvalidOperation):
+        return None
+    # NaN and Infinity cannot be compared with a price.
+    return value if value.is_finite() else None
+
+
+def get_id(request, name):
+    try:
+        return min(max(0, int(request.GET[name])), MAX_ID)
+    except (KeyError, ValueError):
+        return None
+
+
+def search_url(request, **changes):
+    """
+    Returns the current search URL with some parameters changed (or
+    removed, when None), starting again from the first page.
+    """
+    params = request.GET.copy()
+    params.pop("page", None)
+    for name, value in changes.items():
+        params.pop(name, None)
+        if value is not None:
+            params[name] = value
+    return f"{reverse('search')}?{params.urlencode()}"
+
+
+def search_view(request):
+    query = request.GET.get("q", "").strip()
+    filters = {
+        "category": get_id(request, "category"),
+        "min_price": get_decimal(request, "min_price"),
+        "max_price": get_decimal(request, "max_price"),
+        "ending_soon": request.GET.get("ending_soon") == "1",
+    }
+    page = get_page_number(request, "page")
+    results, has_more = search.search(query, page, **filters)
+    facets = search.facets(query)
+    for category in facets["categories"]:
+        selected = category["category_id"] == filters["category"]
+        category["selected"] = selected
+        category["url"] = search_url(request, category=None if selected else category["category_id"])
+    for price in facets["prices"]:
+        selected = (price["min"], price["max"]) == (filters["min_price"], filters["max_price"])
+        price["selected"] = selected
+        price["url"] = search_url(request, min_price=None if selected else price["min"],
+                                  max_price=None if selected else price["max"])
+    return render(request, "auctions/search.html", {
+        "query": query,
+        "results": results,
+        "facets": facets,
+        "ending_soon": filters["ending_soon"],
+        "ending_soon_url": search_url(request, ending_soon=None if filters["ending_soon"] else "1"),
+        "page": page,
+        "previous_url": search_url(request, page=page - 1) if page > 1 else None,
+        "next_url": search_url(request, page=page + 1) if has_more else None,
+    })
+
 def categories(request):
-    categories = Category.objects.all()
     return render(request, "auctions/categories.html", {
-        "categories": categories
+        "categories": catalog.categories()
     })
 
 def category_listings(request, category_id):
-    category = get_object_or_404(Category, id=category_id)
-    listings = Auction.objects.filter(
-        category=category, 
-        is_active=True)
+    name = catalog.get(category_id)
+    if name is None:
+        raise Http404("No such category.")
+    listings, next_cursor = active_listings(category_id=category_id, cursor=request.GET.get("after"))
     return render(request, "auctions/category_listings.html", {
-        "category": category,
-        "listings": listings
+        "category": {"id": category_id, "name": name},
+        "listings": listings,
+        "next_cursor": next_cursor,
+        "is_first_page": "after" not in request.GET
     })   
 
 @login_required
@@ -189,37 +317,15 @@ def place_bid(request, auction_id):
             bid_amount = Decimal(request.POST.get('bid_amount', '0'))
         except (InvalidOperation, ValueError):
             messages.error(request, 'Please enter a valid bid amount.')
-            return redirect('listing_detail', auction_id=auction_id)
-        
-        # Check if auction is active
-        if not auction.is_active:
-            messages.error(request, 'This auction is no longer active.')
-            return redirect('listing_detail', auction_id=auction_id)
-        
-        # Check if user is the owner
-        if auction.owner == request.user:
-            messages.error(request, 'You cannot bid on your own auction.')
-            return redirect('listing_detail', auction_id=auction_id)
+            return redirect('listing_details', auction_id=auction_id)
         
-        # Validate bid amount
-        minimum_bid = auction.get_minimum_bid()
-        if bid_amount < minimum_bid:
-            messages.error(request, f'Bid must be at least ${minimum_bid}.')
-            return redirect('listing_detail', auction_id=auction_id)
-
+        # Activity, ownership and price are all checked atomically by
+        # the bid engine, against the auction as it is right now.
         try:
-            # Create the bid
-            bid = Bid.objects.create(
-                auction=auction,
-                user=request.user,
-                amount=bid_amount
-            )
+            bidding.place_bid(auction, request.user, bid_amount)
             messages.success(request, f'Your bid of ${bid_amount} has been placed successfully!')
-            
-        except ValueError as e:
+        except BidRejected as e:
             messages.error(request, str(e))
-        except Exception as e:
-            messages.error(request, 'An error occurred while placing your bid. Please try again.')
 
     return redirect('auction_detail', auction_id=auction_id)
 
@@ -234,11 +340,70 @@ def close_auction(request, auction_id):
         messages.error(request, "This auction is already closed.")
         return redirect('listing_details', auction_id=auction_id)
     
-    auction.is_active = False
-    highest_bid = auction.bids.order_by('-amount').first()
-    if highest_bid:
-        auction.winner = highest_bid.user
-    auction.save()
+    bidding.close_auction(auction)
     
     messages.success(request, "Auction closed successfully.")
-    return redirect('listing_details', auction_id=auction_id)
\ No newline at end of file
+    return redirect('listing_details', auction_id=auction_id)
+
+
+def media(request, path):
+    """
+    Serves uploaded media. Content-addressed files never change, so they
+    are sent with headers that let browsers and proxies cache them for
+    good.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_content_addressed(path):
+        response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+# Seconds between keep-alive comments on an idle event stream, so that
+# proxies do not time the connection out.
+EVENTS_HEARTBEAT = 15
+
+
+def server_sent_event(message):
+    return f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+
+
+async def auction_events(request, auction_id):
+    """
+    Streams new bids, price changes and the closure of an auction as
+    server-sent events, so viewers need not reload the page. Needs an
+    ASGI server: every open stream is then an idle coroutine rather than
+    a worker thread. Under WSGI it answers 204, which tells browsers not
+    to reconnect, instead of holding a thread for as long as the page is
+    open.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    auction = await (Auction.objects.filter(pk=auction_id)
+        .values("is_active", "current_price", "starting_price", "bid_count").afirst())
+    if auction is None:
+        return HttpResponse(status=404)
+
+    async def stream():
+        subscription = get_broker().subscribe(auction_channel(auction_id))
+        try:
+            price = auction["current_price"] if auction["current_price"] > 0 else auction["starting_price"]
+            yield server_sent_event({"type": "state", "auction": auction_id, "price": str(price),
+                                     "bid_count": auction["bid_count"]})
+            if not auction["is_active"]:
+                yield server_sent_event({"type": "closed", "auction": auction_id})
+                return
+            while True:
+                message = await subscription.get(timeout=EVENTS_HEARTBEAT)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield server_sent_event(message)
+                if message["type"] == "closed":
+                    return
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
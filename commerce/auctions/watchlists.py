@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Auction, Watchlist
+
+
+CACHE_TIMEOUT = getattr(settings, "WATCHLIST_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def _key(user_id):
+    return f"watchlist:{user_id}"
+
+
+def watched_ids(user):
+    """
+    Returns the ids of the auctions user watches, as a frozenset.
+
+    The set is kept in the cache until the user's watchlist changes, and
+    on the user object for the rest of the request, so membership checks
+    and the navbar count usually cost no queries at all.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    ids = getattr(user, "_watched_ids", None)
+    if ids is None:
+        ids = cache.get(_key(user.id))
+        if ids is None:
+            remember(user, Watchlist.objects.filter(user_id=user.id).values_list("auction_id", flat=True))
+        else:
+            user._watched_ids = ids
+    return user._watched_ids
+
+
+def remember(user, auction_ids):
+    """
+    Caches auction_ids as the complete set of auctions user watches, when
+    they were just read for another purpose.
+    """
+    ids = frozenset(auction_ids)
+    cache.set(_key(user.id), ids, CACHE_TIMEOUT)
+    user._watched_ids = ids
+
+
+def is_watching(user, auction_id):
+    return auction_id in watched_ids(user)
+
+
+def watch_count(user):
+    return len(watched_ids(user))
+
+
+def forget(user_id):
+    """
+    Drops the cached watchlist of a user once the current transaction
+    commits, after it changed.
+    """
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
+
+
+def toggle(user, auction):
+    """
+    Adds auction to user's watchlist, or removes it if it was already
+    there. Returns whether the auction is now watched.
+    """
+    # The cached set is dropped by the signal handlers in signals.py.
+    deleted, _ = Watchlist.objects.filter(user_id=user.id, auction_id=auction.id).delete()
+    if not deleted:
+        Watchlist.objects.get_or_create(user_id=user.id, auction_id=auction.id)
+    user._watched_ids = None
+    return not deleted
+
+
+def watched_auctions(user):
+    """
+    Returns the auctions user watches with what the watchlist page shows
+    of them, most recently added first, in one query.
+    """
+    return (Auction.objects.filter(watchlist_items__user_id=user.id)
+        .only("id", "title", "current_price", "starting_price", "is_active", "end_time")
+        .order_by("-watchlist_items__id"))
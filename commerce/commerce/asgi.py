@@ -2,6 +2,9 @@
 ASGI config for commerce project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn commerce.asgi:application``) so
+that the live bid streams of auctions.views.auction_events are held as idle
+coroutines instead of tying up a worker thread each.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -14,3 +17,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
 
 application = get_asgi_application()
+
+# Compile every template up front when TEMPLATE_WARMUP is enabled.
+from .template_loader import warm_up  # noqa: E402
+
+warm_up()
@@ -0,0 +1,95 @@
+"""
+Production settings for commerce project.
+
+Use with DJANGO_SETTINGS_MODULE=commerce.settings_production. Templates are
+loaded through a cached, timing loader and compiled at startup by
+commerce.template_loader.warm_up(), which wsgi.py and asgi.py call.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import TEMPLATES
+
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',') if host]
+
+
+# Templates
+# Compile each template once per process and warm the cache at startup.
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'loaders': [
+                ('commerce.template_loader.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+TEMPLATE_WARMUP = True
+
+
+# Cache
+# Watchlists, listings pages and category counts are cached and invalidated
+# through Django's cache, so every worker process must share one. Set
+# REDIS_URL to use Redis (needs the redis package); otherwise the cache
+# lives in the database, in a table made by `python manage.py createcachetable`.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'commerce_cache',
+        },
+    }
+
+
+# Media
+# Serve MEDIA_ROOT from the web server in front of Django. Auction images
+# are stored under their content hash and never change, so they can be
+# cached for good, e.g. with nginx:
+#
+#   location ~ ^/media/auction_images/[0-9a-f]{2}/ {
+#       root /path/to/commerce;
+#       add_header Cache-Control "public, max-age=31536000, immutable";
+#   }
+
+
+# Logging
+# Template compile times are logged at startup; set TEMPLATE_TIMING_LOG_LEVEL
+# to DEBUG to also log the render time of every page.
+# `python manage.py template_report /some/page ...` renders pages with these
+# settings and prints compile and render times per template.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'template_timing': {
+            'handlers': ['console'],
+            'level': os.environ.get('TEMPLATE_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
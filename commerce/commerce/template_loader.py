@@ -0,0 +1,145 @@
+"""
+Cached template loading with compile/render timing.
+
+Used by the production settings: every template is compiled once per
+process, at startup by warm_up(), and each top-level render is timed.
+Timings are logged to the "template_timing" logger.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loaders import cached
+from django.template.utils import get_app_template_dirs
+
+logger = logging.getLogger("template_timing")
+
+
+class Loader(cached.Loader):
+    """
+    Cached loader that records how long each template took to compile
+    and how long its renders take.
+    """
+
+    def __init__(self, engine, loaders):
+        super().__init__(engine, loaders)
+        self._lock = threading.Lock()
+        self.compile_times = {}
+        self.render_times = {}
+
+    def get_template(self, template_name, skip=None):
+        key = self.cache_key(template_name, skip)
+        fresh = key not in self.get_template_cache
+        start = time.perf_counter()
+        template = super().get_template(template_name, skip)
+        if fresh:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.compile_times[template_name] = elapsed
+            logger.debug("Compiled %s in %.2f ms", template_name, elapsed * 1000)
+            if skip is None:
+                self._time_renders(template_name, template)
+        return template
+
+    def _time_renders(self, template_name, template):
+        render = template.render
+
+        def timed_render(context):
+            start = time.perf_counter()
+            try:
+                return render(context)
+            finally:
+                self._record_render(template_name, time.perf_counter() - start)
+
+        template.render = timed_render
+
+    def _record_render(self, template_name, elapsed):
+        with self._lock:
+            count, total, slowest = self.render_times.get(template_name, (0, 0.0, 0.0))
+            self.render_times[template_name] = (count + 1, total + elapsed, max(slowest, elapsed))
+        logger.debug("Rendered %s in %.2f ms", template_name, elapsed * 1000)
+
+    def reset(self):
+        super().reset()
+        with self._lock:
+            self.compile_times.clear()
+            self.render_times.clear()
+
+
+def _timing_loaders():
+    for backend in engines.all():
+        if isinstance(backend, DjangoTemplates):
+            for loader in backend.engine.template_loaders:
+                if isinstance(loader, Loader):
+                    yield backend.engine, loader
+
+
+def _template_names(engine):
+    directories = list(engine.dirs)
+    if engine.app_dirs or any(isinstance(loader, Loader) for loader in engine.template_loaders):
+        directories.extend(get_app_template_dirs("templates"))
+    for directory in directories:
+        for root, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                path = os.path.join(root, filename)
+                yield os.path.relpath(path, directory).replace(os.sep, "/")
+
+
+def warm_up(force=False):
+    """
+    Compiles every template found in the project's template directories
+    so that no request pays for compilation, and logs the slowest ones.
+    Does nothing unless the TEMPLATE_WARMUP setting is enabled or force
+    is true.
+    """
+    if not force and not getattr(settings, "TEMPLATE_WARMUP", False):
+        return
+    for engine, loader in _timing_loaders():
+        start = time.perf_counter()
+        compiled = 0
+        for name in _template_names(engine):
+            try:
+                engine.get_template(name)
+                compiled += 1
+            except (TemplateDoesNotExist, TemplateSyntaxError) as e:
+                logger.warning("Could not compile %s: %s", name, e)
+        logger.info(
+            "Warmed up %d templates in %.1f ms", compiled, (time.perf_counter() - start) * 1000
+        )
+        slowest = sorted(loader.compile_times.items(), key=lambda item: -item[1])
+        for name, elapsed in slowest[:10]:
+            logger.info("  %-50s compile %.2f ms", name, elapsed * 1000)
+
+
+def has_timing_loader():
+    """
+    Returns True if a template engine loads templates through Loader.
+    """
+    return any(True for _ in _timing_loaders())
+
+
+def template_report():
+    """
+    Returns compile and render timings per template, slowest average
+    render first. The template_report command prints it.
+    """
+    rows = []
+    for _, loader in _timing_loaders():
+        with loader._lock:
+            names = set(loader.compile_times) | set(loader.render_times)
+            for name in names:
+                count, total, slowest = loader.render_times.get(name, (0, 0.0, 0.0))
+                rows.append({
+                    "template": name,
+                    "compile_ms": loader.compile_times.get(name, 0.0) * 1000,
+                    "renders": count,
+                    "average_render_ms": total / count * 1000 if count else 0.0,
+                    "slowest_render_ms": slowest * 1000,
+                })
+    rows.sort(key=lambda row: -row["average_render_ms"])
+    return rows
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project3.settings')
 
 application = get_wsgi_application()
+
+# Compile every template up front when TEMPLATE_WARMUP is enabled.
+from .template_loader import warm_up  # noqa: E402
+
+warm_up()
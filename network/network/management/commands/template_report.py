@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from project4.template_loader import has_timing_loader, template_report, warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Compiles every template through the timing template loader, renders "
+        "the given pages, and prints compile and render times per template."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="*", help="Paths of pages to render, e.g. /.")
+        parser.add_argument("--repeat", type=int, default=10, help="Renders per page.")
+
+    def handle(self, *args, **options):
+        if not has_timing_loader():
+            raise CommandError(
+                "No template engine uses the timing loader; run with the production settings."
+            )
+        warm_up(force=True)
+        client = Client(SERVER_NAME=self.host())
+        for url in options["urls"]:
+            for _ in range(options["repeat"]):
+                status = client.get(url).status_code
+            if status >= 400:
+                self.stderr.write(f"{url} answered {status}.")
+
+        self.stdout.write(f"{'Template':<50} {'Compile':>9} {'Renders':>8} {'Average':>9} {'Slowest':>9}")
+        for row in template_report():
+            self.stdout.write(
+                f"{row['template']:<50} {row['compile_ms']:>7.2f}ms {row['renders']:>8}"
+                f" {row['average_render_ms']:>7.2f}ms {row['slowest_render_ms']:>7.2f}ms"
+            )
+
+    def host(self):
+        # A host the settings allow, so pages are not answered with 400.
+        for host in settings.ALLOWED_HOSTS:
+            host = host.lstrip(".")
+            if host and host != "*":
+                return host
+        return "localhost"
@@ -1,3 +1,16 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from project4 import settings_production
+
+
+@override_settings(TEMPLATES=settings_production.TEMPLATES)
+class TemplateReportTests(TestCase):
+
+    def test_report_lists_compile_and_render_times(self):
+        out = StringIO()
+        call_command("template_report", "/login", repeat=2, stdout=out)
+        self.assertRegex(out.getvalue(), r"network/login\.html +[\d.]+ms +2 ")
+        self.assertRegex(out.getvalue(), r"network/register\.html +[\d.]+ms +0 ")
@@ -1,3 +1,11 @@
 from django.contrib import admin
+from .models import Entry
 
 # Register your models here.
+
+
+class EntryAdmin(admin.ModelAdmin):
+    list_display = ('title', 'updated')
+    search_fields = ('title',)
+    readonly_fields = ('updated',)
+admin.site.register(Entry, EntryAdmin)
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+LOCK_DIRECTORY = ".locks"
+
+# Per-key thread locks, with the number of threads holding or waiting
+# for each, so a key's lock is dropped once nobody needs it.
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def thread_lock(key):
+    """
+    Serializes the threads of this process that lock the same key.
+    """
+    with _locks_guard:
+        entry = _locks.get(key)
+        if entry is None:
+            entry = _locks[key] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _locks[key]
+
+
+def _open_locked(path):
+    # The holder removes the lock file before releasing it, so a file we
+    # opened and then locked may no longer be the one at path; try again
+    # until they match.
+    while True:
+        f = open(path, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            opened = os.fstat(f.fileno())
+            current = os.stat(path)
+        except FileNotFoundError:
+            f.close()
+            continue
+        except BaseException:
+            f.close()
+            raise
+        if (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino):
+            return f
+        f.close()
+
+
+@contextmanager
+def title_lock(directory, title):
+    """
+    Serializes writers of a single entry, both between threads of this
+    process and, where fcntl is available, between worker processes.
+    Readers never take this lock. The lock file is removed on release.
+    """
+    lock_directory = os.path.join(directory, LOCK_DIRECTORY)
+    with thread_lock((lock_directory, title)):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(lock_directory, exist_ok=True)
+        path = os.path.join(lock_directory, f"{title}.lock")
+        f = _open_locked(path)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(path)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+                f.close()
+
+
+def write_atomic(path, data):
+    """
+    Writes bytes to path so that readers see either the old file or the
+    complete new one, never a missing or partially written file.
+    """
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,220 @@
+import io
+import os
+import random
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .atomic import thread_lock, title_lock, write_atomic
+from .catalog import ENTRY_DIRECTORY, catalog
+
+
+DEFAULT_BACKEND = "encyclopedia.backends.FileBackend"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class FileBackend:
+    """
+    Stores each entry as a Markdown file under entries/, with titles
+    tracked by the in-memory entry catalog.
+    """
+
+    def __init__(self, storage=default_storage, directory=ENTRY_DIRECTORY):
+        self.storage = storage
+        self.directory = directory
+        self.catalog = catalog
+
+    def _filename(self, title):
+        return f"{self.directory}/{title}.md"
+
+    def _path(self, title):
+        try:
+            return self.storage.path(self._filename(title))
+        except NotImplementedError:
+            return None
+
+    def titles(self):
+        return self.catalog.titles()
+
+    def exists(self, title):
+        return title in self.catalog
+
+    def lookup(self, title):
+        return self.catalog.lookup(title)
+
+    def random(self):
+        return self.catalog.random()
+
+    def current_generation(self):
+        return self.catalog.current_generation()
+
+    def changes_since(self, stamp):
+        """
+        Returns the modification times, in nanoseconds, of the entries
+        modified at or after stamp (a time.time_ns() value), by title,
+        or None if the storage cannot tell.
+        """
+        changes = {}
+        for title in self.titles():
+            path = self._path(title)
+            if path is None:
+                return None
+            try:
+                modified = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if modified >= stamp:
+                changes[title] = modified
+        return changes
+
+    def get(self, title):
+        try:
+            f = self.storage.open(self._filename(title))
+            return f.read().decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def size(self, title):
+        try:
+            return self.storage.size(self._filename(title))
+        except (FileNotFoundError, NotImplementedError):
+            return None
+
+    def open(self, title):
+        try:
+            return self.storage.open(self._filename(title))
+        except FileNotFoundError:
+            return None
+
+    def write_lock(self, title):
+        path = self._path(title)
+        if path is None:
+            return nullcontext()
+        return title_lock(os.path.dirname(path), title)
+
+    def save(self, title, content):
+        before = self.catalog.stamp()
+        path = self._path(title)
+        if path:
+            write_atomic(path, content.encode("utf-8"))
+        else:
+            # Remote storage: fall back to replacing the file in two steps.
+            filename = self._filename(title)
+            if self.storage.exists(filename):
+                self.storage.delete(filename)
+            self.storage.save(filename, ContentFile(content))
+        self.catalog.add(title, before)
+
+
+class DatabaseBackend:
+    """
+    Stores entries as rows of the Entry model, so listing, existence
+    checks and case-insensitive lookups are answered from indexes and
+    saves are transactional.
+    """
+
+    def __init__(self):
+        self._locks_guard = threading.Lock()
+        self._version = None
+        self.generation = 0
+
+    @property
+    def model(self):
+        from .models import Entry
+        return Entry
+
+    @property
+    def version_model(self):
+        from .models import EntryVersion
+        return EntryVersion
+
+    def titles(self):
+        return list(self.model.objects.order_by("title").values_list("title", flat=True))
+
+    def exists(self, title):
+        return self.model.objects.filter(title=title).exists()
+
+    def lookup(self, title):
+        return (self.model.objects.filter(folded_title=title.lower())
+            .order_by("title").values_list("title", flat=True).first())
+
+    def random(self):
+        count = self.model.objects.count()
+        if not count:
+            return None
+        titles = self.model.objects.order_by("id").values_list("title", flat=True)
+        pick = random.randrange(count)
+        return next(iter(titles[pick:pick + 1]), None)
+
+    def current_generation(self):
+        """
+        Returns a number that changes whenever another process wrote to
+        the Entry table, so derived indexes know to catch up. Costs one
+        primary-key read; this process's own saves leave it unchanged,
+        as they update the indexes directly.
+        """
+        version = self.version_model.current()
+        with self._locks_guard:
+            if version != self._version:
+                self._version = version
+                self.generation += 1
+            return self.generation
+
+    def changes_since(self, stamp):
+        """
+        Returns the update times, in nanoseconds, of the entries updated
+        at or after stamp (a time.time_ns() value), by title. Costs one
+        query on the indexed update time.
+        """
+        since = EPOCH + timedelta(microseconds=stamp // 1000)
+        rows = self.model.objects.filter(updated__gte=since).values_list("title", "updated")
+        return {title: (updated - EPOCH) // timedelta(microseconds=1) * 1000 for title, updated in rows}
+
+    def get(self, title):
+        return self.model.objects.filter(title=title).values_list("content", flat=True).first()
+
+    def size(self, title):
+        return self.model.objects.filter(title=title).values_list("size", flat=True).first()
+
+    def open(self, title):
+        content = self.get(title)
+        if content is None:
+            return None
+        return io.BytesIO(content.encode("utf-8"))
+
+    @contextmanager
+    def write_lock(self, title):
+        with thread_lock((self, title)), transaction.atomic():
+            yield
+
+    def save(self, title, content):
+        with transaction.atomic():
+            self.model.objects.update_or_create(title=title, defaults={"content": content})
+            # The write lock taken by our bump is held until commit, so
+            # the version just before it is exactly one less.
+            version = self.version_model.current()
+        with self._locks_guard:
+            if version - 1 == self._version:
+                self._version = version
+
+
+_backend = None
+_backend_guard = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the entry backend named by the WIKI_ENTRY_BACKEND setting.
+    """
+    global _backend
+    with _backend_guard:
+        if _backend is None:
+            _backend = import_string(getattr(settings, "WIKI_ENTRY_BACKEND", DEFAULT_BACKEND))()
+        return _backend
@@ -0,0 +1,177 @@
+import os
+import random
+import re
+import threading
+
+from django.core.files.storage import default_storage
+
+
+ENTRY_DIRECTORY = "entries"
+
+
+class EntryCatalog:
+    """
+    Process-wide catalog of encyclopedia entry titles.
+
+    The directory is listed once and then kept up to date incrementally
+    by `add` and `remove`. Changes made outside of the application
+    (files copied in or deleted by hand, or by another worker process)
+    are noticed by comparing the modification time of the entries
+    directory before each lookup.
+    """
+
+    def __init__(self, storage=default_storage, directory=ENTRY_DIRECTORY):
+        self.storage = storage
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._titles = []
+        self._positions = {}
+        self._folded = {}
+        self._sorted = None
+        self._stamp = None
+        self._loaded = False
+        self.generation = 0
+
+    def _directory_stamp(self):
+        try:
+            path = self.storage.path(self.directory)
+            return path, os.stat(path).st_mtime_ns
+        except (NotImplementedError, OSError):
+            return None
+
+    def stamp(self):
+        """
+        Returns the current stamp of the entries directory, to be taken
+        before writing to it and passed to `add` or `remove` afterwards.
+        """
+        return self._directory_stamp()
+
+    def _adopt(self, before):
+        # Our own write moved the directory's modification time. The new
+        # stamp may only be taken as ours if the directory was unchanged
+        # up to the write; otherwise another process changed it too and
+        # the directory is listed again.
+        if before == self._stamp:
+            self._stamp = self._directory_stamp()
+        else:
+            self._loaded = False
+            self._refresh()
+
+    def _refresh(self):
+        stamp = self._directory_stamp()
+        if self._loaded and stamp is not None and stamp == self._stamp:
+            return
+        if self._loaded and stamp is None:
+            # Storage without a local path: trust our own bookkeeping.
+            return
+        try:
+            _, filenames = self.storage.listdir(self.directory)
+        except FileNotFoundError:
+            filenames = []
+        self._titles = [re.sub(r"\.md$", "", filename)
+            for filename in filenames if filename.endswith(".md")]
+        self._positions = {title: i for i, title in enumerate(self._titles)}
+        self._folded = {title.lower(): title for title in sorted(self._titles, reverse=True)}
+        self._sorted = None
+        self._stamp = stamp
+        self._loaded = True
+        self.generation += 1
+
+    def titles(self):
+        """
+        Returns a sorted list of all entry titles.
+        """
+        with self._lock:
+            self._refresh()
+            if self._sorted is None:
+                self._sorted = sorted(self._titles)
+            return list(self._sorted)
+
+    def current_generation(self):
+        """
+        Returns a number that changes whenever the catalog is reloaded
+        from the directory, so derived indexes know to rebuild.
+        """
+        with self._lock:
+            self._refresh()
+            return self.generation
+
+    def __contains__(self, title):
+        with self._lock:
+            self._refresh()
+            return title in self._positions
+
+    def lookup(self, title):
+        """
+        Returns the stored title matching the given one case-insensitively,
+        or None if there is no such entry.
+        """
+        with self._lock:
+            self._refresh()
+            return self._folded.get(title.lower())
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._titles)
+
+    def random(self):
+        """
+        Returns a random entry title, or None if there are no entries.
+        """
+        with self._lock:
+            self._refresh()
+            if not self._titles:
+                return None
+            return random.choice(self._titles)
+
+    def add(self, title, before=None):
+        """
+        Records that an entry has been written. before is the directory
+        stamp taken before writing it.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._refresh()
+                return
+            if title not in self._positions:
+                self._positions[title] = len(self._titles)
+                self._titles.append(title)
+                self._folded.setdefault(title.lower(), title)
+                self._sorted = None
+            self._adopt(before)
+
+    def remove(self, title, before=None):
+        """
+        Records that an entry has been deleted. before is the directory
+        stamp taken before deleting it.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._refresh()
+                return
+            position = self._positions.pop(title, None)
+            if position is not None:
+                last = self._titles.pop()
+                if last != title:
+                    self._titles[position] = last
+                    self._positions[last] = position
+                if self._folded.get(title.lower()) == title:
+                    del self._folded[title.lower()]
+                self._sorted = None
+            self._adopt(before)
+
+    def clear(self):
+        """
+        Forgets everything so the next lookup lists the directory again.
+        """
+        with self._lock:
+            self._titles = []
+            self._positions = {}
+            self._folded = {}
+            self._sorted = None
+            self._stamp = None
+            self._loaded = False
+
+
+catalog = EntryCatalog()
@@ -0,0 +1,263 @@
+import bisect
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Title words count this many times over body words when ranking.
+TITLE_BOOST = 3
+
+# Score multiplier for terms that only matched as a prefix of the query word.
+PREFIX_WEIGHT = 0.5
+
+# Entries modified up to this long before the last sync are looked at
+# again, as file modification times lag the clock and workers' clocks
+# may differ slightly.
+CLOCK_SLACK_NS = 1_000_000_000
+
+
+def content_hash(content):
+    return hashlib.sha1((content or "").encode("utf-8")).hexdigest()
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase word tokens.
+    """
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    Inverted index over entry titles and Markdown bodies.
+
+    Queries are ranked with BM25. Every query word also matches the
+    terms it is a prefix of, which are found by bisecting a sorted list
+    of all known terms. The index is loaded once per process, from the
+    file written by the `build_search_index` command if there is one,
+    and then kept current by `update` as entries are saved. Whenever
+    the entry source's generation moves, and on load, it catches up with
+    the entries modified since its last sync, so other processes' writes
+    are picked up without reading every entry. Entries this process
+    saved itself since are skipped unless they were modified again.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._documents = {}
+        self._hashes = {}
+        self._lengths = {}
+        self._terms = []
+        self._total_length = 0
+        self._loaded = False
+        self._generation = None
+        self._pending = set()
+        self._synced = None
+        self._saved = {}
+
+    # Building
+
+    def _add(self, title, content):
+        terms = Counter(tokenize(content or ""))
+        for term in tokenize(title):
+            terms[term] += TITLE_BOOST
+        self._documents[title] = terms
+        self._hashes[title] = content_hash(content)
+        length = sum(terms.values())
+        self._lengths[title] = length
+        self._total_length += length
+        for term, frequency in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[title] = frequency
+
+    def _remove(self, title):
+        terms = self._documents.pop(title, None)
+        if terms is None:
+            return
+        self._hashes.pop(title, None)
+        self._total_length -= self._lengths.pop(title)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[title]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def update(self, title, content):
+        """
+        Indexes (or re-indexes) a single entry.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._pending.add(title)
+                return
+            self._remove(title)
+            self._add(title, content)
+            self._saved[title] = time.time_ns()
+
+    def remove(self, title):
+        with self._lock:
+            self._pending.discard(title)
+            self._remove(title)
+
+    def rebuild(self, titles, get_content):
+        """
+        Discards the index and builds it again from every entry.
+        """
+        with self._lock:
+            self._synced = time.time_ns()
+            self._saved = {}
+            self._postings = {}
+            self._documents = {}
+            self._hashes = {}
+            self._lengths = {}
+            self._terms = []
+            self._total_length = 0
+            for title in titles:
+                self._add(title, get_content(title))
+            self._pending.clear()
+            self._loaded = True
+
+    def sync(self, source):
+        """
+        Loads the saved index on first use, and whenever the entry source
+        (an entry backend) has changed since, catches up with it: entries
+        modified since the last sync and new ones are re-indexed, and
+        deleted ones dropped.
+        """
+        generation = source.current_generation()
+        with self._lock:
+            if self._loaded and generation == self._generation:
+                return
+            if not self._loaded and not self.load():
+                self.rebuild(source.titles(), source.get)
+            else:
+                self._catch_up(source)
+            self._generation = generation
+
+    def _catch_up(self, source):
+        started = time.time_ns()
+        titles = set(source.titles())
+        for title in [title for title in self._documents if title not in titles]:
+            self._remove(title)
+        changes = None
+        if self._synced is not None:
+            changes = source.changes_since(self._synced - CLOCK_SLACK_NS)
+        if changes is None:
+            # The source cannot tell what changed: compare every entry.
+            stale = titles
+        else:
+            stale = {title for title, modified in changes.items()
+                     if modified > self._saved.get(title, -1)}
+            stale |= titles - self._documents.keys()
+            stale |= self._pending
+        for title in stale:
+            content = source.get(title)
+            if content is None:
+                self._remove(title)
+            elif title in self._pending or self._hashes.get(title) != content_hash(content):
+                self._remove(title)
+                self._add(title, content)
+        self._pending.clear()
+        self._saved = {}
+        self._synced = started
+
+    # Persistence
+
+    def load(self):
+        if not self.path:
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self._postings = {}
+        self._documents = {}
+        # Files written before hashes and sync times were kept have
+        # neither, and every entry in them is re-read and re-indexed.
+        self._hashes = dict(data.get("hashes", {}))
+        self._synced = data.get("synced")
+        self._saved = {}
+        self._lengths = {}
+        self._terms = []
+        self._total_length = 0
+        for title, terms in data["documents"].items():
+            terms = Counter(terms)
+            self._documents[title] = terms
+            length = sum(terms.values())
+            self._lengths[title] = length
+            self._total_length += length
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[title] = frequency
+        self._terms = sorted(self._postings)
+        self._loaded = True
+        return True
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"documents": self._documents, "hashes": self._hashes, "synced": self._synced}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.path)
+
+    # Querying
+
+    def _expand(self, word):
+        """
+        Returns (term, weight) pairs for the terms a query word matches.
+        """
+        matches = []
+        i = bisect.bisect_left(self._terms, word)
+        while i < len(self._terms) and self._terms[i].startswith(word):
+            term = self._terms[i]
+            matches.append((term, 1.0 if term == word else PREFIX_WEIGHT))
+            i += 1
+        return matches
+
+    def search(self, query, limit=50):
+        """
+        Returns entry titles matching the query, best match first.
+        """
+        words = set(tokenize(query))
+        with self._lock:
+            count = len(self._documents)
+            if not words or not count:
+                return []
+            average = self._total_length / count
+            scores = Counter()
+            for word in words:
+                for term, weight in self._expand(word):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for title, frequency in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._lengths[title] / average)
+                        scores[title] += weight * idf * frequency * (self.k1 + 1) / (frequency + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [title for title, _ in ranked[:limit]]
+
+
+search_index = SearchIndex(path=getattr(settings, "WIKI_SEARCH_INDEX_PATH", None))
@@ -0,0 +1,59 @@
+import random
+import time
+
+import markdown2
+from django.core.management.base import BaseCommand
+
+from encyclopedia.rendering import BlockRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares full and block-incremental Markdown re-rendering of a "
+        "synthetic entry after a one-paragraph edit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=1024 * 1024, help="Entry size in bytes.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        words = "wiki entry markdown *render* **cache** block `code` [link](/wiki/Python)".split()
+
+        def paragraph():
+            kind = rng.random()
+            if kind < 0.1:
+                return f"## Section {rng.randrange(10 ** 6)}\n\n"
+            if kind < 0.25:
+                return "".join(f"* {' '.join(rng.choices(words, k=8))}\n" for _ in range(4)) + "\n"
+            return " ".join(rng.choices(words, k=80)) + "\n\n"
+
+        paragraphs = []
+        size = 0
+        while size < options["size"]:
+            paragraphs.append(paragraph())
+            size += len(paragraphs[-1])
+        original = "".join(paragraphs)
+        paragraphs[len(paragraphs) // 2] = " ".join(rng.choices(words, k=80)) + "\n\n"
+        edited = "".join(paragraphs)
+
+        renderer = BlockRenderer(max_blocks=len(paragraphs) * 2)
+
+        start = time.perf_counter()
+        markdown2.markdown(edited)
+        full = time.perf_counter() - start
+
+        start = time.perf_counter()
+        renderer.render(original)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        renderer.render(edited)
+        incremental = time.perf_counter() - start
+
+        self.stdout.write(f"Entry:                {len(edited) / 1024:.0f} KB, {len(paragraphs)} blocks")
+        self.stdout.write(f"Full re-render:       {full * 1000:.1f} ms")
+        self.stdout.write(f"Block render (cold):  {cold * 1000:.1f} ms")
+        self.stdout.write(f"Incremental re-render after one edit: {incremental * 1000:.1f} ms "
+                          f"({full / incremental:.1f}x faster)")
@@ -0,0 +1,61 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from encyclopedia.models import Revision
+from encyclopedia.revisions import SNAPSHOT_INTERVAL, get_revision, record_revision
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures revision storage per edit and reconstruction latency on a "
+        "synthetic entry. Nothing is kept: all writes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--edits", type=int, default=200)
+        parser.add_argument("--paragraphs", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        title = "__bench_revisions__"
+        words = "the quick brown fox jumps over lazy dog wiki entry markdown".split()
+        paragraphs = [
+            " ".join(rng.choice(words) for _ in range(60)) + "\n\n"
+            for _ in range(options["paragraphs"])
+        ]
+
+        with transaction.atomic():
+            write_times = []
+            for _ in range(options["edits"]):
+                i = rng.randrange(len(paragraphs))
+                paragraphs[i] = " ".join(rng.choice(words) for _ in range(60)) + "\n\n"
+                start = time.perf_counter()
+                record_revision(title, "".join(paragraphs))
+                write_times.append(time.perf_counter() - start)
+
+            revisions = list(Revision.objects.filter(title=title).values_list("number", "data", "size"))
+            stored = sum(len(data) for _, data, _ in revisions)
+            full = sum(size for _, _, size in revisions)
+
+            read_times = []
+            for number, _, _ in revisions:
+                start = time.perf_counter()
+                get_revision(title, number)
+                read_times.append(time.perf_counter() - start)
+
+            transaction.set_rollback(True)
+
+        count = len(revisions)
+        self.stdout.write(f"Revisions:            {count} (snapshot every {SNAPSHOT_INTERVAL})")
+        self.stdout.write(f"Entry size:           {full // count} bytes")
+        self.stdout.write(f"Stored per edit:      {stored // count} bytes")
+        self.stdout.write(f"Full copies per edit: {full // count} bytes ({full / stored:.1f}x larger)")
+        self.stdout.write(f"Record latency:       median {statistics.median(write_times) * 1000:.2f} ms, "
+                          f"max {max(write_times) * 1000:.2f} ms")
+        self.stdout.write(f"Reconstruct latency:  median {statistics.median(read_times) * 1000:.2f} ms, "
+                          f"max {max(read_times) * 1000:.2f} ms")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia import util
+from encyclopedia.fulltext import search_index
+
+
+class Command(BaseCommand):
+    help = "Builds the full-text search index for every entry in entries/."
+
+    def handle(self, *args, **options):
+        if not search_index.path:
+            raise CommandError("WIKI_SEARCH_INDEX_PATH is not set.")
+        titles = util.list_entries()
+        search_index.rebuild(titles, util.get_entry)
+        search_index.save()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(titles)} entries into {search_index.path}."
+        ))
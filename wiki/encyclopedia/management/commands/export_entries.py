@@ -0,0 +1,24 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia.atomic import write_atomic
+from encyclopedia.models import Entry
+
+
+class Command(BaseCommand):
+    help = "Exports the Entry table to Markdown files in a directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", nargs="?", default="entries")
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        os.makedirs(directory, exist_ok=True)
+
+        exported = 0
+        for title, content in Entry.objects.order_by("title").values_list("title", "content").iterator():
+            write_atomic(os.path.join(directory, f"{title}.md"), content.encode("utf-8"))
+            exported += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {exported} entries to {directory}."))
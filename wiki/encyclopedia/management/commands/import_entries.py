@@ -0,0 +1,50 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from encyclopedia.models import Entry, EntryVersion
+
+
+class Command(BaseCommand):
+    help = "Imports Markdown files from a directory into the Entry table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", nargs="?", default="entries")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory.")
+
+        batch = []
+        imported = 0
+        with transaction.atomic():
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith(".md"):
+                    continue
+                title = filename[:-len(".md")]
+                with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                    content = f.read()
+                batch.append(Entry(title=title, folded_title=title.lower(), content=content,
+                                   size=len(content.encode("utf-8"))))
+                if len(batch) >= options["batch_size"]:
+                    imported += self.flush(batch)
+            imported += self.flush(batch)
+            # bulk_create bypasses Entry.save(), which tells other
+            # processes that entries changed.
+            EntryVersion.bump()
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} entries from {directory}."))
+
+    def flush(self, batch):
+        Entry.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["title"],
+            update_fields=["folded_title", "content", "size", "updated"],
+        )
+        count = len(batch)
+        batch.clear()
+        return count
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+def fill_sizes(apps, schema_editor):
+    Entry = apps.get_model('encyclopedia', 'Entry')
+    EntryVersion = apps.get_model('encyclopedia', 'EntryVersion')
+    entries = []
+    for entry in Entry.objects.only('id', 'content').iterator(chunk_size=500):
+        entry.size = len(entry.content.encode('utf-8'))
+        entries.append(entry)
+        if len(entries) >= 500:
+            Entry.objects.bulk_update(entries, ['size'])
+            entries = []
+    Entry.objects.bulk_update(entries, ['size'])
+    EntryVersion.objects.create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0003_entry_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='entry',
+            name='size',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_sizes, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,73 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 
-# Create your models here.
+
+class Entry(models.Model):
+    """
+    An encyclopedia entry, used when WIKI_ENTRY_BACKEND is the
+    database backend.
+    """
+    title = models.CharField(max_length=255, unique=True)
+    folded_title = models.CharField(max_length=255, db_index=True, editable=False)
+    content = models.TextField()
+    size = models.PositiveIntegerField(default=0, editable=False)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name_plural = "entries"
+
+    def __str__(self):
+        return self.title
+
+    def save(self, *args, **kwargs):
+        self.folded_title = self.title.lower()
+        self.size = len(self.content.encode("utf-8"))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            EntryVersion.bump()
+
+
+class EntryVersion(models.Model):
+    """
+    A single row whose version every write to the Entry table bumps, so
+    that each process can tell with one primary-key read whether entries
+    changed since it last looked.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(version=F("version") + 1):
+            cls.objects.bulk_create([cls(pk=1)], ignore_conflicts=True)
+            cls.objects.filter(pk=1).update(version=F("version") + 1)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+
+@receiver(post_delete, sender=Entry)
+def entry_deleted(sender, **kwargs):
+    EntryVersion.bump()
+
+
+class Revision(models.Model):
+    """
+    One saved version of an entry. Every SNAPSHOT_INTERVAL-th revision
+    stores the full compressed content; the others store a compressed
+    line delta against the revision before them.
+    """
+    title = models.CharField(max_length=255)
+    number = models.PositiveIntegerField()
+    is_snapshot = models.BooleanField(default=False)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('title', 'number')
+
+    def __str__(self):
+        return f'{self.title} revision {self.number}'
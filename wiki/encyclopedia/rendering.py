@@ -0,0 +1,311 @@
+import codecs
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import markdown2
+from django.conf import settings
+
+
+FENCE_RE = re.compile(r"^\s{0,3}(```|~~~)")
+LIST_ITEM_RE = re.compile(r"^\s{0,3}([*+-]|\d+[.)])\s")
+LINK_DEFINITION_RE = re.compile(r"^\s{0,3}\[[^\]]+\]:\s*\S.*$", re.MULTILINE)
+# The block-level tags markdown2 passes through untouched, from the first
+# line starting with one up to the first line ending with its end tag.
+HTML_BLOCK_RE = re.compile(r"^<(%s)\b" % markdown2.Markdown._block_tags_a)
+# Likewise a comment starting a block, up to the first line with "-->".
+HTML_COMMENT_RE = re.compile(r"^\s{0,3}<!--")
+
+
+def iter_blocks(lines):
+    """
+    Yields the top-level blocks of Markdown, given an iterable of its
+    lines, so that blocks render independently.
+
+    Blocks are separated by blank lines, except that fenced code, raw
+    HTML blocks and HTML comments stay whole, and indented lines, further list items
+    and further quoted lines after a blank line continue the block
+    before them.
+    """
+    current = []
+    fence = None
+    html = None
+    blank = False
+    kind = None
+    for line in lines:
+        if fence:
+            current.append(line)
+            if line.lstrip().startswith(fence):
+                fence = None
+            continue
+        if html:
+            current.append(line)
+            if html == "-->" and html in line or line.rstrip().endswith(html):
+                html = None
+            continue
+        if not line.strip():
+            if current:
+                current.append(line)
+                blank = True
+            continue
+        if blank:
+            continues = (
+                line[0] in " \t"
+                or (kind == "list" and LIST_ITEM_RE.match(line))
+                or (kind == "quote" and line.lstrip().startswith(">"))
+            )
+            if not continues:
+                yield "".join(current)
+                current = []
+        if not current:
+            match = HTML_COMMENT_RE.match(line)
+            if match and "-->" not in line[match.end():]:
+                html = "-->"
+            if LIST_ITEM_RE.match(line):
+                kind = "list"
+            elif line.lstrip().startswith(">"):
+                kind = "quote"
+            else:
+                kind = None
+        blank = False
+        current.append(line)
+        match = FENCE_RE.match(line)
+        if match:
+            fence = match.group(1)
+        match = HTML_BLOCK_RE.match(line)
+        if match and not line.rstrip().endswith(f"</{match.group(1)}>"):
+            html = f"</{match.group(1)}>"
+    if current:
+        yield "".join(current)
+
+
+def split_blocks(text):
+    """
+    Returns the list of top-level blocks of a Markdown string.
+    """
+    return list(iter_blocks(text.splitlines(keepends=True)))
+
+
+def iter_lines(chunks):
+    """
+    Yields lines, with their line endings, from an iterable of text chunks.
+    """
+    partial = ""
+    for chunk in chunks:
+        lines = (partial + chunk).splitlines(keepends=True)
+        partial = ""
+        if lines and not lines[-1].endswith(("\n", "\r")):
+            partial = lines.pop()
+        yield from lines
+    if partial:
+        yield partial
+
+
+def read_chunks(f, chunk_size=64 * 1024):
+    """
+    Yields decoded text chunks from a binary UTF-8 file.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            break
+        yield decoder.decode(data)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def link_definitions(lines):
+    """
+    Returns the reference-style link definitions found in Markdown lines,
+    ready to be prepended to a block.
+    """
+    definitions = "".join(line for line in lines if LINK_DEFINITION_RE.match(line))
+    if definitions:
+        definitions += "\n"
+    return definitions
+
+
+class BlockRenderer:
+    """
+    Renders Markdown block by block, memoizing each block's HTML by a
+    hash of its source. After a small edit to a long entry only the
+    changed blocks go through markdown2 again.
+
+    Reference-style link definitions apply to the whole document, so
+    they are prepended to every block and included in its hash.
+    """
+
+    def __init__(self, max_blocks=20000):
+        self.max_blocks = max_blocks
+        self._lock = threading.Lock()
+        self._blocks = OrderedDict()
+
+    def render_blocks(self, text):
+        """
+        Yields the HTML of each top-level block of the document in order.
+        """
+        lines = text.splitlines(keepends=True)
+        return self.render_lines(lines, link_definitions(lines))
+
+    def render_lines(self, lines, definitions=""):
+        """
+        Yields the HTML of each top-level block read from an iterable of
+        lines, with the document's link definitions given up front.
+        """
+        for block in iter_blocks(lines):
+            if definitions and not LINK_DEFINITION_RE.sub("", block).strip():
+                continue
+            source = definitions + block
+            key = hashlib.sha1(source.encode("utf-8")).digest()
+            with self._lock:
+                html = self._blocks.get(key)
+                if html is not None:
+                    self._blocks.move_to_end(key)
+            if html is None:
+                html = markdown2.markdown(source)
+                with self._lock:
+                    self._blocks[key] = html
+                    while len(self._blocks) > self.max_blocks:
+                        self._blocks.popitem(last=False)
+            yield html
+
+    def render(self, text):
+        return "".join(self.render_blocks(text))
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+block_renderer = BlockRenderer(getattr(settings, "WIKI_RENDER_BLOCK_CACHE_SIZE", 20000))
+
+# Entries at least this long are rendered block by block.
+INCREMENTAL_THRESHOLD = getattr(settings, "WIKI_INCREMENTAL_RENDER_THRESHOLD", 32 * 1024)
+
+
+def render_markdown(content):
+    """
+    Converts Markdown to HTML, reusing cached blocks for long documents.
+    """
+    if len(content) >= INCREMENTAL_THRESHOLD:
+        return block_renderer.render(content)
+    return markdown2.markdown(content)
+
+
+class RenderCache:
+    """
+    Caches the HTML rendered from each entry's Markdown.
+
+    Entries are keyed by title and validated against a hash of the
+    Markdown source, so a stale rendering is never served even if the
+    file was changed behind our back. The in-memory tier is a
+    size-bounded LRU; the optional on-disk tier stores renderings by
+    content hash so they survive restarts and are shared by workers.
+    """
+
+    def __init__(self, max_entries=256, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(content):
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def render(self, title, content):
+        """
+        Returns the HTML for an entry, rendering it only if no cached
+        copy of this exact content exists.
+        """
+        digest = self.digest(content)
+        with self._lock:
+            cached = self._entries.get(title)
+            if cached is not None and cached[0] == digest:
+                self._entries.move_to_end(title)
+                self.hits += 1
+                return cached[1]
+
+        html = self._read_disk(digest)
+        if html is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            html = render_markdown(content)
+            self._write_disk(digest, html)
+            with self._lock:
+                self.misses += 1
+
+        self._store(title, digest, html)
+        return html
+
+    def _store(self, title, digest, html):
+        with self._lock:
+            self._entries[title] = (digest, html)
+            self._entries.move_to_end(title)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_path(self, digest):
+        return os.path.join(self.directory, f"{digest}.html")
+
+    def _read_disk(self, digest):
+        if not self.directory:
+            return None
+        try:
+            with open(self._disk_path(digest), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, digest, html):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(html)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self._disk_path(digest))
+        except OSError:
+            pass
+
+    def invalidate(self, title):
+        """
+        Drops the in-memory rendering of an entry.
+        """
+        with self._lock:
+            self._entries.pop(title, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        """
+        Returns the hit and miss counters and the current size.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+render_cache = RenderCache(
+    max_entries=getattr(settings, "WIKI_RENDER_CACHE_SIZE", 256),
+    directory=getattr(settings, "WIKI_RENDER_CACHE_DIR", None),
+)
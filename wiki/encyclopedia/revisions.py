@@ -0,0 +1,147 @@
+import difflib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Revision
+
+
+# A full snapshot is stored every this many revisions, which bounds the
+# number of deltas applied to reconstruct any revision.
+SNAPSHOT_INTERVAL = getattr(settings, "WIKI_REVISION_SNAPSHOT_INTERVAL", 10)
+
+# The newest revision of recently edited entries, so that saving an edit
+# does not have to reconstruct the revision it is diffed against.
+LATEST_CACHE_SIZE = 128
+
+_latest = OrderedDict()
+_latest_lock = threading.Lock()
+
+
+def _remember(title, number, content):
+    with _latest_lock:
+        _latest[title] = (number, content)
+        _latest.move_to_end(title)
+        while len(_latest) > LATEST_CACHE_SIZE:
+            _latest.popitem(last=False)
+
+
+def _latest_content(title, number):
+    with _latest_lock:
+        cached = _latest.get(title)
+    if cached is not None and cached[0] == number:
+        return cached[1]
+    return get_revision(title, number)
+
+
+def make_delta(old, new):
+    """
+    Returns a list of operations that turn the lines of old into the
+    lines of new: ["c", start, end] copies old lines, ["i", lines]
+    inserts new ones.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["c", i1, i2])
+        elif j2 > j1:
+            ops.append(["i", new_lines[j1:j2]])
+    return ops
+
+
+def apply_delta(old, ops):
+    old_lines = old.splitlines(keepends=True)
+    lines = []
+    for op in ops:
+        if op[0] == "c":
+            lines.extend(old_lines[op[1]:op[2]])
+        else:
+            lines.extend(op[1])
+    return "".join(lines)
+
+
+def _decode(revision, previous):
+    data = zlib.decompress(bytes(revision.data)).decode("utf-8")
+    if revision.is_snapshot:
+        return data
+    return apply_delta(previous, json.loads(data))
+
+
+def get_revision(title, number):
+    """
+    Reconstructs the content of a revision of an entry, or returns None
+    if there is no such revision. At most SNAPSHOT_INTERVAL rows are
+    read and at most SNAPSHOT_INTERVAL - 1 deltas applied.
+    """
+    snapshot = (Revision.objects
+        .filter(title=title, number__lte=number, is_snapshot=True)
+        .order_by("-number").first())
+    if snapshot is None:
+        return None
+    content = _decode(snapshot, None)
+    deltas = (Revision.objects
+        .filter(title=title, number__gt=snapshot.number, number__lte=number)
+        .order_by("number"))
+    last = snapshot.number
+    for revision in deltas:
+        content = _decode(revision, content)
+        last = revision.number
+    if last != number:
+        return None
+    return content
+
+
+def list_revisions(title):
+    """
+    Returns the revisions of an entry, newest first, without their data.
+    """
+    return (Revision.objects.filter(title=title)
+        .order_by("-number").only("title", "number", "size", "timestamp"))
+
+
+def _store(title, number, content, previous):
+    if previous is None or number % SNAPSHOT_INTERVAL == 1:
+        is_snapshot = True
+        data = content
+    else:
+        is_snapshot = False
+        data = json.dumps(make_delta(previous, content), separators=(",", ":"))
+    return Revision.objects.create(
+        title=title,
+        number=number,
+        is_snapshot=is_snapshot,
+        data=zlib.compress(data.encode("utf-8"), 9),
+        size=len(content),
+    )
+
+
+def record_revision(title, content, get_previous=None):
+    """
+    Stores content as the newest revision of an entry. If the entry has
+    no history yet, get_previous() is called to store the content it had
+    before this save as revision 1.
+    """
+    with transaction.atomic():
+        last = (Revision.objects.filter(title=title)
+            .order_by("-number").values_list("number", flat=True).first())
+        previous = None
+        if last is None:
+            last = 0
+            previous = get_previous() if get_previous else None
+            if previous is not None:
+                last = 1
+                _store(title, last, previous, None)
+        else:
+            previous = _latest_content(title, last)
+        if previous == content:
+            return None
+        revision = _store(title, last + 1, content, previous)
+    _remember(title, revision.number, content)
+    return revision
@@ -0,0 +1,130 @@
+import bisect
+import math
+import threading
+from collections import Counter
+
+
+# Minimum Dice coefficient between trigram sets for a title to be suggested.
+MIN_SIMILARITY = 0.4
+
+
+def trigrams(text):
+    """
+    Returns the set of character trigrams of a padded, lowercased string.
+    """
+    text = f"  {text.lower()} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Trigram index over entry titles for typo-tolerant suggestions.
+
+    Each title is broken into character trigrams and a posting set is
+    kept per trigram, so a lookup only touches titles that share at
+    least one trigram with the query. A sorted list of lowercased
+    titles is kept alongside for plain prefix completion.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._grams = {}
+        self._prefixes = []
+        self._generation = None
+
+    def sync(self, source):
+        """
+        Brings the index up to date with the entry source (the catalog
+        or an entry backend) if it has changed since the last sync, by
+        adding new titles and dropping deleted ones.
+        """
+        generation = source.current_generation()
+        with self._lock:
+            if generation == self._generation:
+                return
+        titles = source.titles()
+        with self._lock:
+            current = set(titles)
+            for title in [title for title in self._grams if title not in current]:
+                self._remove(title)
+            for title in titles:
+                self._add(title)
+            self._generation = generation
+
+    def _add(self, title):
+        if title in self._grams:
+            return
+        grams = trigrams(title)
+        self._grams[title] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(title)
+        bisect.insort(self._prefixes, (title.lower(), title))
+
+    def add(self, title):
+        with self._lock:
+            self._add(title)
+
+    def _remove(self, title):
+        grams = self._grams.pop(title, None)
+        if grams is None:
+            return
+        for gram in grams:
+            postings = self._postings[gram]
+            postings.discard(title)
+            if not postings:
+                del self._postings[gram]
+        i = bisect.bisect_left(self._prefixes, (title.lower(), title))
+        del self._prefixes[i]
+
+    def remove(self, title):
+        with self._lock:
+            self._remove(title)
+
+    def suggest(self, query, limit=5):
+        """
+        Returns titles that look like the query, most similar first.
+
+        Similarity is the Dice coefficient of the two trigram sets.
+        Shared trigrams are counted over the query's posting sets, and
+        titles sharing too few to reach MIN_SIMILARITY are skipped
+        before any scoring.
+        """
+        query_grams = trigrams(query)
+        size = len(query_grams)
+        needed = max(1, math.ceil(MIN_SIMILARITY * size / (2 - MIN_SIMILARITY)))
+        shared = Counter()
+        scored = []
+        with self._lock:
+            for gram in query_grams:
+                shared.update(self._postings.get(gram, ()))
+            for title, count in shared.items():
+                if count < needed:
+                    continue
+                similarity = 2 * count / (size + len(self._grams[title]))
+                if similarity >= MIN_SIMILARITY:
+                    scored.append((-similarity, title))
+        scored.sort()
+        return [title for _, title in scored[:limit]]
+
+    def complete(self, query, limit=10):
+        """
+        Returns titles starting with the query, followed by titles that
+        look like it, for the search box's autocomplete.
+        """
+        prefix = query.lower()
+        results = []
+        with self._lock:
+            i = bisect.bisect_left(self._prefixes, (prefix,))
+            while (i < len(self._prefixes) and len(results) < limit
+                    and self._prefixes[i][0].startswith(prefix)):
+                results.append(self._prefixes[i][1])
+                i += 1
+        if len(results) < limit:
+            for title in self.suggest(query, limit):
+                if title not in results:
+                    results.append(title)
+        return results[:limit]
+
+
+suggestions = TrigramIndex()
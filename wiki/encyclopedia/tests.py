@@ -1,3 +1,487 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import markdown2
+from django.core.files.storage import FileSystemStorage
+from django.core.management import CommandError, call_command
+from django.template import engines
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from wiki import template_loader
+
+from . import atomic, backends, revisions, util, views
+from .atomic import write_atomic
+from .backends import FileBackend
+from .catalog import EntryCatalog, catalog
+from .fulltext import search_index
+from .models import Entry, Revision
+from .rendering import BlockRenderer, RenderCache, block_renderer, render_cache
+from .revisions import SNAPSHOT_INTERVAL
+from .suggest import suggestions
+
+
+class WikiTestCase(TestCase):
+    """
+    Runs each test against an empty entries/ directory in a temporary
+    MEDIA_ROOT, with the process-wide catalog, indexes and caches reset.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.entries = os.path.join(self.root, "entries")
+        os.makedirs(self.entries)
+        media = override_settings(MEDIA_ROOT=self.root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.reset()
+        self.addCleanup(self.reset)
+
+    def reset(self):
+        catalog.clear()
+        render_cache.clear()
+        block_renderer.clear()
+        search_index.__init__()
+        suggestions.__init__()
+        revisions._latest.clear()
+        backends._backend = None
+
+    def write(self, title, content):
+        with open(os.path.join(self.entries, f"{title}.md"), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def age_directory(self):
+        # Directory modification times are coarse, so make sure the next
+        # change to entries/ moves it.
+        os.utime(self.entries, ns=(0, 0))
+
+
+class CatalogTests(WikiTestCase):
+
+    def backend(self):
+        # One backend per simulated worker process, each with its own catalog.
+        storage = FileSystemStorage(location=self.root)
+        backend = FileBackend(storage)
+        backend.catalog = EntryCatalog(storage)
+        return backend
+
+    def test_lists_and_looks_up_titles(self):
+        self.write("Python", "# Python")
+        self.write("Django", "# Django")
+        self.assertEqual(util.list_entries(), ["Django", "Python"])
+        self.assertTrue(util.entry_exists("Python"))
+        self.assertEqual(util.find_entry("python"), "Python")
+        self.assertIn(util.random_entry(), ["Django", "Python"])
+
+    def test_notices_files_added_by_hand(self):
+        self.write("Python", "# Python")
+        self.age_directory()
+        self.assertEqual(util.list_entries(), ["Python"])
+        self.write("Git", "# Git")
+        self.assertEqual(util.list_entries(), ["Git", "Python"])
+
+    def test_save_keeps_entries_written_by_another_process(self):
+        a, b = self.backend(), self.backend()
+        self.age_directory()
+        self.assertEqual(a.titles(), [])
+        self.assertEqual(b.titles(), [])
+        b.save("FromB", "Written by B")
+        a.save("Zeta", "Written by A")
+        self.assertEqual(a.titles(), ["FromB", "Zeta"])
+        self.assertTrue(a.exists("FromB"))
+
+
+class RenderCacheTests(WikiTestCase):
+
+    def test_renders_each_content_once(self):
+        self.write("Python", "# Python")
+        self.assertContains(self.client.get("/wiki/Python"), "<h1>Python</h1>", html=True)
+        self.client.get("/wiki/Python")
+        self.assertEqual((render_cache.stats()["misses"], render_cache.stats()["hits"]), (1, 1))
+
+    def test_changed_content_is_rendered_again(self):
+        self.write("Python", "# Python")
+        self.client.get("/wiki/Python")
+        self.write("Python", "# Snake")
+        self.assertContains(self.client.get("/wiki/Python"), "<h1>Snake</h1>", html=True)
+        util.save_entry("Python", "# Language")
+        self.assertContains(self.client.get("/wiki/Python"), "<h1>Language</h1>", html=True)
+
+    def test_disk_tier_is_shared_between_caches(self):
+        directory = os.path.join(self.root, "rendered")
+        first = RenderCache(directory=directory)
+        html = first.render("Python", "*snake*")
+        second = RenderCache(directory=directory)
+        self.assertEqual(second.render("Python", "*snake*"), html)
+        self.assertEqual(second.stats()["disk_hits"], 1)
+
+
+class SearchIndexTests(WikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.write("Python", "Python is a programming language.")
+        self.write("Django", "Django is a web framework written in Python.")
+        self.write("Git", "Git tracks changes to files.")
+
+    def restart(self):
+        # What a new worker process starts with.
+        catalog.clear()
+        search_index.__init__(path=self.index_path)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, "search_index.json")
+
+    def test_ranks_title_matches_first_and_matches_prefixes(self):
+        self.assertEqual(util.search_entries("python"), ["Python", "Django"])
+        self.assertEqual(util.search_entries("chang"), ["Git"])
+        self.assertEqual(util.search_entries("quokka"), [])
+
+    def test_search_view_redirects_exact_titles(self):
+        self.assertRedirects(self.client.get("/search", {"q": "git"}), "/wiki/Git", fetch_redirect_response=False)
+        response = self.client.get("/search", {"q": "framework"})
+        self.assertEqual(response.context["results"], ["Django"])
+
+    def test_saved_index_picks_up_entries_changed_since(self):
+        search_index.path = self.index_path
+        call_command("build_search_index", stdout=StringIO())
+        util.save_entry("Zeta", "A quokka lives here.")
+        self.write("Git", "Git is a quokka too.")
+        self.restart()
+        self.assertCountEqual(util.search_entries("quokka"), ["Git", "Zeta"])
+
+    def test_picks_up_entries_saved_by_another_process(self):
+        self.age_directory()
+        self.assertEqual(util.search_entries("quokka"), [])
+        self.write("Zeta", "A quokka lives here.")
+        self.assertEqual(util.search_entries("quokka"), ["Zeta"])
+
+    def age_entries(self):
+        # As if every entry had been written well before the index.
+        for filename in os.listdir(self.entries):
+            os.utime(os.path.join(self.entries, filename), ns=(0, 0))
+
+    def count_reads(self):
+        return mock.patch.object(FileBackend, "get", autospec=True, side_effect=FileBackend.get)
+
+    def test_another_process_write_reads_only_what_changed(self):
+        for i in range(50):
+            self.write(f"Entry {i}", f"Entry number {i}.")
+        self.age_entries()
+        util.search_entries("entry")
+        util.save_entry("Python", "Python is a quokka's favourite language.")
+        self.age_directory()
+        self.write("Zeta", "A quokka lives here.")
+        with self.count_reads() as get:
+            self.assertCountEqual(util.search_entries("quokka"), ["Python", "Zeta"])
+        self.assertEqual([call.args[1] for call in get.call_args_list], ["Zeta"])
+
+    def test_saved_index_is_loaded_without_reading_entries(self):
+        self.age_entries()
+        search_index.path = self.index_path
+        call_command("build_search_index", stdout=StringIO())
+        self.restart()
+        with self.count_reads() as get:
+            self.assertEqual(util.search_entries("framework"), ["Django"])
+        self.assertEqual(get.call_count, 0)
+
+
+@override_settings(WIKI_ENTRY_BACKEND="encyclopedia.backends.DatabaseBackend")
+class DatabaseBackendTests(WikiTestCase):
+
+    def test_stores_entries_as_rows(self):
+        util.save_entry("Python", "# Python")
+        util.save_entry("Django", "# Django")
+        self.assertEqual(os.listdir(self.entries), [])
+        self.assertEqual(util.list_entries(), ["Django", "Python"])
+        self.assertEqual(util.find_entry("DJANGO"), "Django")
+        self.assertEqual(util.get_entry("Python"), "# Python")
+        self.assertEqual(util.entry_size("Python"), len("# Python"))
+        self.assertIn(util.random_entry(), ["Django", "Python"])
+        self.assertContains(self.client.get("/wiki/Python"), "<h1>Python</h1>", html=True)
+
+    def test_indexes_see_entries_saved_by_another_process(self):
+        util.save_entry("Python", "# Python")
+        self.assertEqual(util.complete_entries("Qu"), [])
+        self.assertEqual(util.search_entries("marsupial"), [])
+        # Written by another worker, bypassing this process's indexes.
+        Entry.objects.create(title="Quokka", content="A small marsupial.")
+        self.assertEqual(util.complete_entries("Qu"), ["Quokka"])
+        self.assertEqual(util.suggest_entries("Quoka"), ["Quokka"])
+        self.assertEqual(util.search_entries("marsupial"), ["Quokka"])
+        Entry.objects.filter(title="Quokka").delete()
+        self.assertEqual(util.complete_entries("Qu"), [])
+
+    def test_own_saves_keep_the_generation(self):
+        backend = backends.get_backend()
+        util.save_entry("Python", "# Python")
+        generation = backend.current_generation()
+        util.save_entry("Django", "# Django")
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.current_generation(), generation)
+        Entry.objects.create(title="Quokka", content="A small marsupial.")
+        self.assertNotEqual(backend.current_generation(), generation)
+
+    def test_another_process_write_costs_a_few_queries(self):
+        for i in range(20):
+            util.save_entry(f"Entry {i}", f"Entry number {i}.")
+        Entry.objects.update(updated=timezone.now() - timedelta(days=1))
+        util.search_entries("entry")
+        Entry.objects.create(title="Quokka", content="A small marsupial.")
+        # Version, titles, changed titles and the changed entry.
+        with self.assertNumQueries(4):
+            self.assertEqual(util.search_entries("marsupial"), ["Quokka"])
+        with self.assertNumQueries(1):
+            self.assertEqual(util.search_entries("marsupial"), ["Quokka"])
+
+    def test_random_picks_every_entry_alike_despite_gaps(self):
+        for title in ("Ant", "Bee", "Cat", "Dog", "Eel"):
+            util.save_entry(title, f"# {title}")
+        Entry.objects.filter(title__in=["Bee", "Cat"]).delete()
+        with mock.patch("random.randrange", side_effect=range(3)):
+            picks = [util.random_entry() for _ in range(3)]
+        self.assertEqual(picks, ["Ant", "Dog", "Eel"])
+
+    def test_size_counts_bytes(self):
+        util.save_entry("Café", "# Café")
+        self.assertEqual(util.entry_size("Café"), len("# Café".encode("utf-8")))
+
+    def test_import_and_export_entries(self):
+        self.write("Python", "# Python")
+        call_command("import_entries", self.entries, stdout=StringIO())
+        self.assertEqual(Entry.objects.get().content, "# Python")
+        Entry.objects.update(content="# Snake")
+        call_command("export_entries", self.entries, stdout=StringIO())
+        with open(os.path.join(self.entries, "Python.md"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "# Snake")
+
+
+class SuggestionTests(WikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for title in ("Python", "Django", "JavaScript", "Java"):
+            self.write(title, f"# {title}")
+
+    def test_suggests_titles_despite_typos(self):
+        self.assertEqual(util.suggest_entries("Pyhton"), ["Python"])
+        self.assertEqual(util.suggest_entries("Djnago"), ["Django"])
+        self.assertEqual(util.suggest_entries("Haskell"), [])
+
+    def test_search_page_offers_suggestions_when_nothing_matches(self):
+        response = self.client.get("/search", {"q": "Pythn"})
+        self.assertEqual(response.context["results"], [])
+        self.assertContains(response, 'href="/wiki/Python"')
+
+    def test_autocomplete_lists_prefix_matches_first(self):
+        response = self.client.get("/autocomplete", {"q": "ja"})
+        self.assertEqual(response.json()["suggestions"][:2], ["Java", "JavaScript"])
+        util.save_entry("Jasmine", "# Jasmine")
+        self.assertEqual(util.complete_entries("jas")[0], "Jasmine")
+
+
+class AtomicWriteTests(WikiTestCase):
+
+    def test_readers_never_see_a_missing_or_partial_entry(self):
+        versions = ["# Python\n" + letter * 200000 for letter in "ab"]
+        util.save_entry("Python", versions[0])
+        seen = set()
+        done = threading.Event()
+
+        def read():
+            while not done.is_set():
+                seen.add(util.get_entry("Python"))
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        try:
+            for i in range(20):
+                util.save_entry("Python", versions[i % 2])
+        finally:
+            done.set()
+            reader.join()
+        self.assertLessEqual(seen, set(versions))
+
+    def test_failed_write_keeps_the_old_entry(self):
+        path = os.path.join(self.entries, "Python.md")
+        write_atomic(path, b"# Python")
+        with mock.patch("os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                write_atomic(path, b"# Snake")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"# Python")
+        self.assertEqual(sorted(os.listdir(self.entries)), ["Python.md"])
+
+    def test_concurrent_saves_of_one_entry_are_serialized(self):
+        # Through the backend, as util.save_entry does, but without
+        # recording revisions from other threads' database connections.
+        backend = backends.get_backend()
+
+        def save(i):
+            with backend.write_lock("Python"):
+                backend.save("Python", f"# Version {i}")
+
+        threads = [threading.Thread(target=save, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertRegex(util.get_entry("Python"), r"^# Version \d$")
+        self.assertEqual(util.list_entries(), ["Python"])
+        self.assertEqual(atomic._locks, {})
+        self.assertEqual(os.listdir(os.path.join(self.entries, atomic.LOCK_DIRECTORY)), [])
+
+    def test_removed_lock_files_still_serialize_processes(self):
+        counter = os.path.join(self.root, "counter")
+        with open(counter, "w") as f:
+            f.write("0")
+
+        def increment():
+            for _ in range(20):
+                with atomic.title_lock(self.entries, "Python"):
+                    with open(counter) as f:
+                        value = int(f.read())
+                    with open(counter, "w") as f:
+                        f.write(str(value + 1))
+
+        processes = [multiprocessing.get_context("fork").Process(target=increment) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        with open(counter) as f:
+            self.assertEqual(f.read(), "80")
+
+    def test_locks_are_dropped_once_released(self):
+        for i in range(5):
+            util.save_entry(f"Entry {i}", "# Entry")
+        self.assertEqual(atomic._locks, {})
+        self.assertEqual(os.listdir(os.path.join(self.entries, atomic.LOCK_DIRECTORY)), [])
+
+
+class RevisionTests(WikiTestCase):
+
+    def test_saves_keep_every_revision(self):
+        self.write("Python", "# Python\n")
+        for i in range(1, SNAPSHOT_INTERVAL + 3):
+            util.save_entry("Python", f"# Python\n\nEdit {i}\n")
+        numbers = [revision.number for revision in util.entry_history("Python")]
+        self.assertEqual(numbers, list(range(SNAPSHOT_INTERVAL + 3, 0, -1)))
+        self.assertEqual(util.get_entry_revision("Python", 1), "# Python\n")
+        self.assertEqual(util.get_entry_revision("Python", SNAPSHOT_INTERVAL + 2), f"# Python\n\nEdit {SNAPSHOT_INTERVAL + 1}\n")
+        self.assertIsNone(util.get_entry_revision("Python", 99))
+        self.assertEqual(Revision.objects.filter(is_snapshot=True).count(), 2)
+
+    def test_saving_unchanged_content_adds_no_revision(self):
+        util.save_entry("Python", "# Python")
+        util.save_entry("Python", "# Python")
+        self.assertEqual(len(util.entry_history("Python")), 1)
+
+    def test_revision_pages_do_not_use_the_entry_cache(self):
+        util.save_entry("Python", "# Python")
+        util.save_entry("Python", "# Snake")
+        self.assertContains(self.client.get("/history/Python"), 'href="/history/Python/1"')
+        response = self.client.get("/history/Python/1")
+        self.assertContains(response, "<h1>Python</h1>", html=True)
+        self.assertEqual(render_cache.stats()["size"], 0)
+
+
+@override_settings(
+    TEMPLATE_WARMUP=True,
+    TEMPLATES=[{
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": [],
+        "OPTIONS": {
+            "context_processors": ["django.template.context_processors.request"],
+            "loaders": [("wiki.template_loader.Loader", ["django.template.loaders.app_directories.Loader"])],
+        },
+    }],
+)
+class TemplateLoaderTests(WikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # The engine, and so its timings, outlive a single test.
+        for loader in engines["django"].engine.template_loaders:
+            loader.reset()
+
+    def test_warm_up_compiles_templates_and_renders_are_timed(self):
+        with self.assertLogs("template_timing", "INFO") as logs:
+            template_loader.warm_up()
+        self.assertIn("Warmed up", logs.output[0])
+        self.write("Python", "# Python")
+        self.client.get("/wiki/Python")
+        self.client.get("/wiki/Python")
+        report = {row["template"]: row for row in template_loader.template_report()}
+        self.assertGreater(report["encyclopedia/layout.html"]["compile_ms"], 0)
+        self.assertEqual(report["encyclopedia/entry.html"]["renders"], 2)
+
+    def test_report_command_prints_render_times(self):
+        self.write("Python", "# Python")
+        out = StringIO()
+        call_command("template_report", "/wiki/Python", repeat=3, stdout=out)
+        self.assertRegex(out.getvalue(), r"encyclopedia/entry\.html +[\d.]+ms +3 ")
+
+    @override_settings(TEMPLATES=[{"BACKEND": "django.template.backends.django.DjangoTemplates", "APP_DIRS": True}])
+    def test_report_command_needs_the_timing_loader(self):
+        with self.assertRaises(CommandError):
+            call_command("template_report", stdout=StringIO())
+
+
+class BlockRendererTests(TestCase):
+
+    documents = [
+        "# Title\n\nA paragraph with a [link][python].\n\n[python]: /wiki/Python\n",
+        "* one\n* two\n\n* three\n\nAfter the list.\n",
+        "> quoted\n\n> still quoted\n\nNot quoted.\n",
+        "```\ncode\n\nmore code\n```\n\nText.\n",
+        "<div>\n\nhello\n\n</div>\n",
+        "Before.\n\n<table>\n<tr><td>1</td></tr>\n\n<tr><td>2</td></tr>\n</table>\n\nAfter *markdown*.\n",
+        "<div>one line</div>\n\nText.\n",
+        "Before.\n\n<!-- a comment\n\nspanning a blank line -->\n\nAfter.\n",
+        "<!-- one line -->\n\n<!--\n\n-->\n\nText.\n",
+    ]
+
+    def test_renders_like_markdown2(self):
+        for document in self.documents:
+            with self.subTest(document=document):
+                self.assertHTMLEqual(BlockRenderer().render(document), markdown2.markdown(document))
+
+    def test_edit_renders_only_the_changed_block(self):
+        renderer = BlockRenderer()
+        paragraphs = [f"Paragraph {i}.\n\n" for i in range(50)]
+        renderer.render("".join(paragraphs))
+        paragraphs[25] = "Edited.\n\n"
+        with mock.patch("markdown2.markdown", wraps=markdown2.markdown) as render:
+            html = renderer.render("".join(paragraphs))
+        self.assertEqual(render.call_count, 1)
+        self.assertIn("<p>Edited.</p>", html)
+
+
+class StreamingTests(WikiTestCase):
+
+    content = "# Big\n\n" + "".join(f"Paragraph {i} with a [link][python].\n\n" for i in range(300)) + (
+        "<div>\n\nraw\n\n</div>\n\n[python]: /wiki/Python\n"
+    )
+
+    def test_large_entries_are_streamed_as_they_render(self):
+        self.write("Big", self.content)
+        with mock.patch.object(views, "STREAMING_THRESHOLD", 1024):
+            response = self.client.get("/wiki/Big")
+        self.assertTrue(response.streaming)
+        html = b"".join(response.streaming_content).decode("utf-8")
+        self.assertIn('<a href="/wiki/Python">link</a>', html)
+        self.assertInHTML(markdown2.markdown(self.content), html)
+        self.assertIn("<title>", html)
+
+    def test_small_entries_are_not_streamed(self):
+        self.write("Small", "# Small")
+        self.assertFalse(self.client.get("/wiki/Small").streaming)
@@ -6,7 +6,10 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("wiki/<str:title>", views.entry , name= "entry"),
     path("search", views.search, name= "search"),
+    path("autocomplete", views.autocomplete, name="autocomplete"),
     path("create", views.create, name="create"),
     path("random", views.random_page, name="random_page"),
     path("edit/<str:title>", views.edit, name="edit"),
+    path("history/<str:title>", views.history, name="history"),
+    path("history/<str:title>/<int:number>", views.revision, name="revision"),
 ]
@@ -1,27 +1,80 @@
-import re
-
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
+from .backends import get_backend
+from .fulltext import search_index
+from .rendering import block_renderer, iter_lines, link_definitions, read_chunks, render_cache, render_markdown
+from .revisions import get_revision, list_revisions, record_revision
+from .suggest import suggestions
 
 
 def list_entries():
     """
     Returns a list of all names of encyclopedia entries.
     """
-    _, filenames = default_storage.listdir("entries")
-    return list(sorted(re.sub(r"\.md$", "", filename)
-        for filename in filenames if filename.endswith(".md")))
+    return get_backend().titles()
+
+
+def entry_exists(title):
+    """
+    Returns True if an encyclopedia entry with the given title exists.
+    """
+    return get_backend().exists(title)
+
+
+def find_entry(title):
+    """
+    Returns the title of the encyclopedia entry whose name matches
+    the given one case-insensitively, or None if there is none.
+    """
+    return get_backend().lookup(title)
+
+
+def search_entries(query):
+    """
+    Returns the titles of entries whose title or content matches the
+    query, best match first.
+    """
+    search_index.sync(get_backend())
+    return search_index.search(query)
+
+
+def suggest_entries(query, limit=5):
+    """
+    Returns titles of entries whose names look like the query, for
+    "did you mean" suggestions.
+    """
+    suggestions.sync(get_backend())
+    return suggestions.suggest(query, limit)
+
+
+def complete_entries(query, limit=10):
+    """
+    Returns titles of entries to offer while the query is being typed.
+    """
+    suggestions.sync(get_backend())
+    return suggestions.complete(query, limit)
+
+
+def random_entry():
+    """
+    Returns the title of a random encyclopedia entry, or None if
+    there are no entries.
+    """
+    return get_backend().random()
+
 
 def save_entry(title, content):
     """
     Saves an encyclopedia entry, given its title and Markdown
     content. If an existing entry with the same title already exists,
-    it is replaced.
+    it is replaced atomically, so concurrent readers always see either
+    the old or the new content.
     """
-    filename = f"entries/{title}.md"
-    if default_storage.exists(filename):
-        default_storage.delete(filename)
-    default_storage.save(filename, ContentFile(content))
+    backend = get_backend()
+    with backend.write_lock(title):
+        record_revision(title, content, lambda: backend.get(title))
+        backend.save(title, content)
+        render_cache.invalidate(title)
+        search_index.update(title, content)
+        suggestions.add(title)
 
 
 def get_entry(title):
@@ -29,8 +82,57 @@ def get_entry(title):
     Retrieves an encyclopedia entry by its title. If no such
     entry exists, the function returns None.
     """
-    try:
-        f = default_storage.open(f"entries/{title}.md")
-        return f.read().decode("utf-8")
-    except FileNotFoundError:
-        return None
+    return get_backend().get(title)
+
+
+def entry_size(title):
+    """
+    Returns the size of an encyclopedia entry's Markdown without reading
+    it, or None if no such entry exists.
+    """
+    return get_backend().size(title)
+
+
+def stream_entry(title):
+    """
+    Yields the HTML of an encyclopedia entry block by block, reading its
+    Markdown in chunks so the whole entry is never held in memory.
+    """
+    f = get_backend().open(title)
+    if f is None:
+        return
+    with f:
+        definitions = link_definitions(iter_lines(read_chunks(f)))
+        f.seek(0)
+        yield from block_renderer.render_lines(iter_lines(read_chunks(f)), definitions)
+
+
+def entry_history(title):
+    """
+    Returns the saved revisions of an encyclopedia entry, newest first.
+    """
+    return list_revisions(title)
+
+
+def get_entry_revision(title, number):
+    """
+    Retrieves the content of one revision of an encyclopedia entry, or
+    None if there is no such revision.
+    """
+    return get_revision(title, number)
+
+
+def render_revision(content):
+    """
+    Returns the HTML for the Markdown of an old revision. It is not kept
+    in the entry cache, where it would push out current entries.
+    """
+    return render_markdown(content)
+
+
+def render_entry(title, content):
+    """
+    Returns the HTML for an encyclopedia entry's Markdown content,
+    reusing a cached rendering when the content has not changed.
+    """
+    return render_cache.render(title, content)
@@ -1,8 +1,14 @@
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 
 from . import util
-import random
-import markdown2
+
+# Entries at least this many bytes long are streamed to the client.
+STREAMING_THRESHOLD = getattr(settings, "WIKI_STREAMING_THRESHOLD", 256 * 1024)
+
+CONTENT_PLACEHOLDER = "<!-- entry-content -->"
 
 def index(request):
     return render(request, "encyclopedia/index.html", {
@@ -10,6 +16,10 @@ def index(request):
     })
 
 def entry(request ,title):
+    size = util.entry_size(title)
+    if size is not None and size >= STREAMING_THRESHOLD:
+        return stream_entry(request, title)
+
     content = util.get_entry(title)
 
     if content is None:
@@ -19,25 +29,42 @@ def entry(request ,title):
     else:
         return render (request , "encyclopedia/entry.html", {
             "title": title , 
-            "content": html_content
+            "content": util.render_entry(title, content)
         })
 
-def search (request):
-    query =  request.GET.get('q')
-    all_entries= util.list_entries()
+def stream_entry(request, title):
+    page = render_to_string("encyclopedia/entry.html", {
+        "title": title,
+        "content": CONTENT_PLACEHOLDER
+    }, request)
+    head, tail = page.split(CONTENT_PLACEHOLDER, 1)
+
+    def body():
+        yield head
+        yield from util.stream_entry(title)
+        yield tail
 
-    for entry in all_entries:
-        if query.lower() == entry.lower():
-            return redirect('entry', title=entry)
+    return StreamingHttpResponse(body(), content_type="text/html; charset=utf-8")
 
-    partial_matches = []
-    for entry in all_entries:
-        if query.lower() in entry.lower():
-            partial_matches.append(entry)
+def search (request):
+    query =  request.GET.get('q', '')
 
+    match = util.find_entry(query)
+    if match is not None:
+        return redirect('entry', title=match)
+
+    results = util.search_entries(query)
     return render(request, 'encyclopedia/search_results.html', {
         'query':query,
-        'results':partial_matches
+        'results':results,
+        'suggestions':util.suggest_entries(query) if not results else []
+    })
+
+def autocomplete(request):
+    query = request.GET.get('q', '').strip()
+    return JsonResponse({
+        'query': query,
+        'suggestions': util.complete_entries(query) if query else []
     })
 
 def create(request):
@@ -48,7 +75,7 @@ def create(request):
         title = request.POST.get('title')
         content = request.POST.get('content')
 
-        if util.get_entry(title) is not None:
+        if util.entry_exists(title):
             return render(request, "encyclopedia/create.html", {
                 "error": f'An entry with the tittle "{title}" already exists.'
             })
@@ -82,17 +109,31 @@ def edit(request, title):
 
 
 def random_page(request):
-    entries= util.list_entries()
-    if not entries:
+    random_entry= util.random_entry()
+    if random_entry is None:
         return redirect("index")
-    random_entry= random.choice(entries)
     return redirect('entry', title=random_entry)
 
-def entry(request, title):
-    content = util.get_entry(title)
-    if content:
-        html_content = markdown2.markdown(content)
-        return render(request, 'encyclopedia/entry.html', {
-            'title': title,
-            'content': html_content
-        })
\ No newline at end of file
+
+def history(request, title):
+    if not util.entry_exists(title):
+        return render (request , "encyclopedia/error.html", {
+            "title": title
+        })
+    return render(request, "encyclopedia/history.html", {
+        "title": title,
+        "revisions": util.entry_history(title)
+    })
+
+
+def revision(request, title, number):
+    content = util.get_entry_revision(title, number)
+    if content is None:
+        return render (request , "encyclopedia/error.html", {
+            "title": f"{title} (revision {number})"
+        })
+    return render(request, "encyclopedia/revision.html", {
+        "title": title,
+        "number": number,
+        "content": util.render_revision(content)
+    })
@@ -119,3 +119,33 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# Rendered entry HTML cache
+# WIKI_RENDER_CACHE_SIZE bounds the in-memory LRU; set WIKI_RENDER_CACHE_DIR
+# to a directory to also keep renderings on disk across restarts.
+
+WIKI_RENDER_CACHE_SIZE = 256
+WIKI_RENDER_CACHE_DIR = None
+
+# Full-text search index, written by `manage.py build_search_index`
+
+WIKI_SEARCH_INDEX_PATH = os.path.join(BASE_DIR, 'search_index.json')
+
+# Where encyclopedia entries are stored: Markdown files under entries/
+# (encyclopedia.backends.FileBackend) or the Entry table in the database
+# (encyclopedia.backends.DatabaseBackend). Use the import_entries and
+# export_entries commands to move entries between the two.
+
+WIKI_ENTRY_BACKEND = 'encyclopedia.backends.FileBackend'
+
+# Entries of at least WIKI_INCREMENTAL_RENDER_THRESHOLD characters are
+# rendered block by block, with up to WIKI_RENDER_BLOCK_CACHE_SIZE block
+# renderings kept in memory.
+
+WIKI_INCREMENTAL_RENDER_THRESHOLD = 32 * 1024
+WIKI_RENDER_BLOCK_CACHE_SIZE = 20000
+
+# Entries of at least WIKI_STREAMING_THRESHOLD bytes are read in chunks and
+# streamed to the client block by block instead of rendered in one piece.
+
+WIKI_STREAMING_THRESHOLD = 256 * 1024
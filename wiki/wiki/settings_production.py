@@ -0,0 +1,62 @@
+"""
+Production settings for wiki project.
+
+Use with DJANGO_SETTINGS_MODULE=wiki.settings_production. Templates are
+loaded through a cached, timing loader and compiled at startup by
+wiki.template_loader.warm_up(), which wsgi.py and asgi.py call.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import TEMPLATES
+
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',') if host]
+
+
+# Templates
+# Compile each template once per process and warm the cache at startup.
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'loaders': [
+                ('wiki.template_loader.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+TEMPLATE_WARMUP = True
+
+
+# Logging
+# Template compile times are logged at startup; set TEMPLATE_TIMING_LOG_LEVEL
+# to DEBUG to also log the render time of every page.
+# `python manage.py template_report /some/page ...` renders pages with these
+# settings and prints compile and render times per template.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'template_timing': {
+            'handlers': ['console'],
+            'level': os.environ.get('TEMPLATE_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}